@@ -0,0 +1,152 @@
+"""
+Benchmark for lib/cptoml.py on CPython.
+
+Generates synthetic settings files and reports per operation latency and
+peak allocated memory (tracemalloc) for keys, fetch, table, put and delete.
+
+    python benchmarks/cptoml_bench.py
+    python benchmarks/cptoml_bench.py --sizes 10 1000 --mode stream --json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import cptoml
+
+SIZES = [10, 100, 1000, 10000]
+KEYS_PER_TABLE = 10
+
+# mode -> module settings
+MODES = {
+    "cache": {"CACHE_MAX": 1 << 30, "JOURNAL": False, "SNAPSHOT": False},
+    "stream": {"CACHE_MAX": 0, "JOURNAL": False, "SNAPSHOT": False},
+    "journal": {"CACHE_MAX": 1 << 30, "JOURNAL": True, "SNAPSHOT": False},
+    "snapshot": {"CACHE_MAX": 1 << 30, "JOURNAL": False, "SNAPSHOT": True},
+}
+
+
+def make_settings(path: str, lines: int) -> tuple:
+    """
+    Write a settings file of roughly the given line count.
+    Returns the (table, key) of the last entry, the worst case for scans.
+    """
+    table, key = None, None
+    written = 0
+    with open(path, "w") as f:
+        f.write('CIRCUITPY_WEB_API_PASSWORD = "bench"\n')
+        written += 1
+        t = 0
+        while written < lines:
+            table = f"table{t}"
+            f.write(f"\n[{table}]\n")
+            written += 1
+            for k in range(KEYS_PER_TABLE):
+                if written >= lines:
+                    break
+                key = f"key{k}"
+                if k % 3 == 0:
+                    f.write(f'{key} = "value {t}.{k}"\n')
+                elif k % 3 == 1:
+                    f.write(f"{key} = {t * 100 + k}\n")
+                else:
+                    f.write(f"{key} = true\n")
+                written += 1
+            t += 1
+    return table, key
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Time func over repeat calls, then trace the peak allocation of one more.
+    """
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter_ns() - start) / repeat
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"us": round(elapsed / 1000, 2), "peak_bytes": peak}
+
+
+def bench(lines: int, mode: str, repeat: int) -> list:
+    for name, value in MODES[mode].items():
+        setattr(cptoml, name, value)
+    cptoml.invalidate()
+
+    workdir = tempfile.mkdtemp(prefix="cptoml_bench_")
+    toml = os.path.join(workdir, "settings.toml")
+    try:
+        table, key = make_settings(toml, lines)
+        size = os.path.getsize(toml)
+
+        # Cold reads pay for the parse, warm ones show what the cache saves
+        def cold(func):
+            def run():
+                cptoml.invalidate()
+                func()
+
+            return run
+
+        ops = [
+            ("keys cold", cold(lambda: cptoml.keys(table, toml)), repeat),
+            ("keys", lambda: cptoml.keys(table, toml), repeat),
+            ("fetch cold", cold(lambda: cptoml.fetch(key, table, toml)), repeat),
+            ("fetch", lambda: cptoml.fetch(key, table, toml), repeat),
+            ("table", lambda: cptoml.table(table, toml), repeat),
+            ("fetch_many", lambda: cptoml.fetch_many(["key0", key], table, toml), repeat),
+            ("put", lambda: cptoml.put("bench", 1, table, toml), max(1, repeat // 10)),
+            ("delete", lambda: cptoml.delete("bench", table, toml), max(1, repeat // 10)),
+        ]
+        res = []
+        for name, func, count in ops:
+            row = {"mode": mode, "lines": lines, "bytes": size, "op": name}
+            row.update(measure(func, count))
+            res.append(row)
+        return res
+    finally:
+        cptoml.invalidate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(rows: list) -> None:
+    header = f"{'mode':<9} {'lines':>6} {'bytes':>8} {'op':<11} {'us/op':>11} {'peak B':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['mode']:<9} {r['lines']:>6} {r['bytes']:>8} {r['op']:<11} "
+            f"{r['us']:>11.2f} {r['peak_bytes']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="line counts")
+    parser.add_argument(
+        "--mode", choices=list(MODES) + ["all"], default="all", help="cptoml settings"
+    )
+    parser.add_argument("--repeat", type=int, default=50, help="calls per read op")
+    parser.add_argument("--json", action="store_true", help="print JSON instead")
+    args = parser.parse_args()
+
+    rows = []
+    for mode in MODES if args.mode == "all" else [args.mode]:
+        for lines in args.sizes:
+            rows += bench(lines, mode, args.repeat)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
@@ -0,0 +1,173 @@
+"""
+Loopback benchmark for lib/telnet_console.py on CPython.
+
+A scripted client connects over a real loopback socket, performs the IAC
+handshake and then exchanges data with the console. Reported per maxbuf:
+negotiation time, write() throughput, read latency (client send to read()
+return) and the CPU time spent inside _rt / _rr.
+
+    python benchmarks/telnet_bench.py
+    python benchmarks/telnet_bench.py --maxbuf 64 256 --json
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import telnet_console as tc
+
+MAXBUFS = [16, 64, 256, 1024]
+HANDSHAKE = bytes(
+    (tc.IAC, tc.WILL, tc.TT, tc.IAC, tc.WONT, tc.LINEMODE, tc.IAC, tc.EON, 0)
+)
+DONE = bytes((tc.IAC, tc.WONT, tc.ECHO))
+
+
+class _PortSocket(socket.socket):
+    """
+    The console always binds port 23, move it somewhere unprivileged.
+    """
+
+    port = 0
+
+    def bind(self, address):
+        super().bind((address[0], self.port))
+        _PortSocket.port = self.getsockname()[1]
+
+
+class _Timed:
+    """
+    Wraps a console method, adding up its CPU time and calls.
+    """
+
+    def __init__(self, func) -> None:
+        self.func = func
+        self.cpu = 0
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        start = time.thread_time_ns()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.cpu += time.thread_time_ns() - start
+            self.calls += 1
+
+
+def _until(cond, timeout=5.0) -> None:
+    end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > end:
+            raise TimeoutError("console did not get there in time")
+
+
+def bench(maxbuf: int, total: int, chunk: int, pings: int) -> dict:
+    listener = _PortSocket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    con = tc.telnet_console(
+        listener,
+        "127.0.0.1",
+        maxbuf=maxbuf,
+        txsize=max(512, chunk * 4),
+        overflow=tc.OVERFLOW_BLOCK,
+        accept_interval=None,
+    )
+    rt = con._rt = _Timed(con._rt)
+    rr = con._rr = _Timed(con._rr)
+    res = {"maxbuf": maxbuf}
+    client = socket.create_connection(("127.0.0.1", _PortSocket.port))
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        # Negotiation, the client answers as soon as it hears WILL ECHO
+        start = time.perf_counter_ns()
+        client.sendall(HANDSHAKE)
+
+        def answer():
+            seen = b""
+            while bytes((tc.IAC, tc.WILL, tc.ECHO)) not in seen:
+                seen += client.recv(64)
+            client.sendall(DONE)
+
+        waiter = threading.Thread(target=answer, daemon=True)
+        waiter.start()
+        _until(lambda: con.poll() or con.connected)
+        res["negotiation_ms"] = round((time.perf_counter_ns() - start) / 1e6, 3)
+        waiter.join()
+
+        # write() throughput, a client thread drains the other end
+        received = [0]
+
+        def drain():
+            while received[0] < total:
+                data = client.recv(65536)
+                if not data:
+                    break
+                received[0] += len(data)
+
+        drainer = threading.Thread(target=drain, daemon=True)
+        drainer.start()
+        payload = b"x" * chunk
+        rt.cpu = rt.calls = 0
+        start = time.perf_counter_ns()
+        sent = 0
+        while sent < total:
+            sent += con.write(payload)
+        while con.out_waiting():
+            con.flush()
+        drainer.join(10)
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        res["write_Bps"] = round(received[0] / elapsed)
+        res["rt_cpu_ms"] = round(rt.cpu / 1e6, 3)
+        res["rt_calls"] = rt.calls
+
+        # read() latency, one line at a time
+        buf = bytearray(maxbuf)
+        mv = memoryview(buf)
+        lat = []
+        rr.cpu = rr.calls = 0
+        for _ in range(pings):
+            start = time.perf_counter_ns()
+            client.sendall(b"ping\r\n")
+            got = 0
+            while got < 6:
+                got += con.readinto(mv[got:])
+            lat.append(time.perf_counter_ns() - start)
+        lat.sort()
+        res["read_p50_us"] = round(lat[len(lat) // 2] / 1000, 1)
+        res["read_p99_us"] = round(lat[int(len(lat) * 0.99)] / 1000, 1)
+        res["rr_cpu_ms"] = round(rr.cpu / 1e6, 3)
+        res["rr_calls"] = rr.calls
+    finally:
+        client.close()
+        con.disconnect()
+        listener.close()
+    return res
+
+
+def print_table(rows: list) -> None:
+    cols = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{r[c]:>14}" for c in cols))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--maxbuf", type=int, nargs="+", default=MAXBUFS, help="sizes")
+    parser.add_argument("--total", type=int, default=1 << 20, help="bytes to write")
+    parser.add_argument("--chunk", type=int, default=64, help="bytes per write()")
+    parser.add_argument("--pings", type=int, default=200, help="read latency samples")
+    parser.add_argument("--json", action="store_true", help="print JSON instead")
+    args = parser.parse_args()
+
+    rows = [bench(m, args.total, args.chunk, args.pings) for m in args.maxbuf]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
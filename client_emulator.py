@@ -4,9 +4,24 @@ import re
 import os
 import sys
 import getpass
+import struct
 import termios
 import tty
 
+BINARY = "--binary" in sys.argv  # Send move / forward / stop as binary packets
+
+# Binary control packets, network byte order:
+# magic, opcode, target ipv4, left, right, sequence number
+PKT_FMT = ">BBIhhH"
+PKT_SIZE = 12
+PKT_MAGIC = 0xA5
+PKT_KEEP = -32768  # Speed that leaves the motor as is
+OP_STOP = 0
+OP_MOVE = 1
+OP_FORWARD = 2
+
+seq = 0
+
 
 def input2(value: str = "") -> str:
     old = termios.tcgetattr(sys.stdin)
@@ -55,46 +70,90 @@ def ip_input(prompt: str, default: str = "") -> str:
         print("\nInvalid IPv4 address. Please try again.")
 
 
+def pack_command(target_ip: str, command: str):
+    """
+    Turn a text command into a binary packet, None if it has no binary form.
+    """
+    global seq
+    args = command.split()
+    try:
+        if args == ["stop"]:
+            op, left, right = OP_STOP, 0, 0
+        elif args[0] == "forward" and len(args) == 2:
+            op, left, right = OP_FORWARD, int(args[1]), 0
+        elif args[0] == "move" and len(args) == 3:
+            speed = max(min(int(args[2]), 100), -100)
+            op = OP_MOVE
+            left, right = (PKT_KEEP, speed) if int(args[1]) else (speed, PKT_KEEP)
+        else:
+            return None
+    except ValueError:
+        return None
+    seq = (seq + 1) & 0xFFFF
+    ip = int.from_bytes(socket.inet_aton(target_ip), "big")
+    return struct.pack(PKT_FMT, PKT_MAGIC, op, ip, left, right, seq)
+
+
 def handle_incoming(client_socket):
     # Get the local machine's IP address
     local_ip = socket.gethostbyname(socket.gethostname())
 
     commanding = False
+    pending = b""  # Unfinished line or packet of the last receive
     try:
         while True:
             response = client_socket.recv(1024)
             if not response:
                 print("Connection closed by the server.")
                 break
-            message = response.decode("utf-8")
-            match = re.match(r"\[(.*?)\]\s*(.*)", message)
-            if match:
-                target_ip, command = match.groups()
-                if (
-                    target_ip == "0.0.0.0"
-                    or target_ip == local_ip
-                    or (target_ip == "127.0.0.1")
-                ):
-                    if command == "vote":
-                        # Give the server a urandom byte
-                        client_socket.sendall(
-                            b"[0.0.0.0] "
-                            + str(int.from_bytes(os.urandom(1), "big")).encode("utf-8")
-                        )
-                        commanding = False  # Reset since a new voting proccess started
-                    elif command == "master":
-                        commanding = True
-                        print("I am king!")
-                    elif command == "forward":
-                        forward(int(cmd[1]))
-                    elif command == "move":
-                        move(bool(int(cmd[1])), int(cmd[2]))
-                    elif command == "stop":
-                        stop()
-                    elif command == "Unauthorized":
-                        pass
-                    else:
-                        print(f"Unknown command: {command}")
+            # Lines and packets can arrive together or split across receives:
+            # PKT_MAGIC starts a PKT_SIZE packet, anything else runs to a newline
+            data = pending + response
+            messages = []
+            pos = 0
+            while pos < len(data):
+                if data[pos] == PKT_MAGIC:
+                    if len(data) - pos < PKT_SIZE:
+                        break
+                    _, op, ip, left, right, pseq = struct.unpack_from(PKT_FMT, data, pos)
+                    print(
+                        f"Packet #{pseq} op {op} to {socket.inet_ntoa(ip.to_bytes(4, 'big'))}:"
+                        f" {left} {right}"
+                    )
+                    pos += PKT_SIZE
+                    continue
+                end = data.find(b"\n", pos)
+                if end < 0:
+                    break
+                messages.append(data[pos:end].decode("utf-8", "replace").rstrip("\r"))
+                pos = end + 1
+            pending = data[pos:]
+            for message in messages:
+                match = re.match(r"\[(.*?)\]\s*(.*)", message)
+                if match:
+                    target_ip, command = match.groups()
+                    if (
+                        target_ip == "0.0.0.0"
+                        or target_ip == local_ip
+                        or (target_ip == "127.0.0.1")
+                    ):
+                        if command == "vote":
+                            # Give the server a urandom byte
+                            client_socket.sendall(
+                                b"[0.0.0.0] "
+                                + str(int.from_bytes(os.urandom(1), "big")).encode("utf-8")
+                                + b"\n"
+                            )
+                            commanding = False  # Reset since a new voting proccess started
+                        elif command == "master":
+                            commanding = True
+                            print("I am king!")
+                        elif command.split()[:1] in (["forward"], ["move"], ["stop"]):
+                            print(f"Robot command: {command}")  # Meant for the robots
+                        elif command == "Unauthorized":
+                            pass
+                        else:
+                            print(f"Unknown command: {command}")
 
     except (socket.error, ConnectionResetError):
         print("Connection error while receiving messages.")
@@ -122,6 +181,8 @@ def client(server_ip: str, server_port: int = 5080):
         incoming_thread.start()
 
         client_socket.sendall(b"[0.0.0.0] slave\n")
+        if BINARY:
+            client_socket.sendall(b"[0.0.0.0] binary\n")
         client_socket.sendall(b"[0.0.0.0] vote\n")
 
         while True:
@@ -158,7 +219,12 @@ def client(server_ip: str, server_port: int = 5080):
                     else:
                         print()
 
-                    message = f"[{target_ip}] {command}"
+                    packet = pack_command(target_ip, command) if BINARY else None
+                    if packet:
+                        client_socket.sendall(packet)
+                        break
+
+                    message = f"[{target_ip}] {command}\n"  # The server frames lines by it
 
                     # Send the message to the server
                     client_socket.sendall(message.encode("utf-8"))
@@ -10,21 +10,62 @@ JOLT_SPD = 0  # Boost speed
 JOLT_TIME = 0.1  # Boost time
 RAMP_INC = 1024  # Speed increments
 RAMP_TICK = 0.001  # Time per speed step
+RAMP_PROFILE = "linear"  # Ramp shape, one of RAMP_PROFILES
+RAMP_CATCHUP = 2  # Most steps taken at once after a late tick
 PORT = 5225  # Socket port
 HOST = "10.42.0.33"
+BINARY = True  # Ask the server for binary control packets
+LOOP_TICK = 0.005  # Idle sleep of the network and console tasks
+STATUS_TIME = 1  # Time between status reports
+CONNECT_TIMEOUT = 8  # Server connection timeout, waited out without blocking
+BACKOFF_MIN = 0.05  # First reconnect delay, doubles on each failure
+BACKOFF_MAX = 5  # Longest reconnect delay
+PING_TIME = 2  # Server silence before asking whether it is still there
+LINK_TIMEOUT = 5  # Server silence, the ping unanswered, before the link counts as lost
 DEBUG = True
 
 # Load libraries
-import board, digitalio, pwmio, time, wifi, microcontroller, ipaddress
+import board, digitalio, pwmio, time, wifi, microcontroller, ipaddress, math, asyncio
+
+from array import array
 
 from neopixel_write import neopixel_write
 from traceback import print_exception
 from usb_cdc import console as usbcon
 from socketpool import SocketPool
 from os import urandom
-from sys import exit
-
-from cptoml import keys, fetch
+from errno import EAGAIN, ETIMEDOUT, EINPROGRESS, EALREADY
+try:
+    from errno import EISCONN
+except ImportError:  # Missing from some ports, lwIP's number
+    EISCONN = 106
+from struct import unpack_from
+from binascii import hexlify, unhexlify
+
+from cptoml import table, fetch_many, edit
+import cptrace
+
+# Tracing, records are only turned into text when drained while idle
+cptrace.configure(level=cptrace.DEBUG if DEBUG else cptrace.WARN)
+T_MOTOR = 1  # Trace category bits
+T_SYS = 2
+EV_RAMP = cptrace.event("Ramping.. {} to {}", cptrace.DEBUG, T_MOTOR)
+EV_STOP = cptrace.event("Stopping!", cptrace.INFO, T_MOTOR)
+EV_MOVE = cptrace.event(
+    lambda right, value: "Setting " + ("right" if right else "left") + " to " + str(value),
+    cptrace.INFO,
+    T_MOTOR,
+)
+EV_JOLT = cptrace.event(
+    lambda right, value: "Jolting " + ("right" if right else "left") + " to " + str(value),
+    cptrace.INFO,
+    T_MOTOR,
+)
+EV_STATUS = cptrace.event(
+    lambda king, stopped: ("King" if king else "Slave") + (", stopped" if stopped else ", moving"),
+    cptrace.INFO,
+    T_SYS,
+)
 
 # Init neopixel
 nx = digitalio.DigitalInOut(board.NEOPIXEL)
@@ -54,100 +95,163 @@ fr = pwmio.PWMOut(board.IO5, frequency=MOTOR_FREQ, duty_cycle=65535)
 bl = pwmio.PWMOut(board.IO4, frequency=MOTOR_FREQ, duty_cycle=65535)
 br = pwmio.PWMOut(board.IO3, frequency=MOTOR_FREQ, duty_cycle=65535)
 
-# Last set state variables
-fls = 65535
-frs = 65535
-bls = 65535
-brs = 65535
+# Channel indexes
+FL = 0
+FR = 1
+BL = 2
+BR = 3
+
+motors = (fl, fr, bl, br)
+duty = [65535, 65535, 65535, 65535]  # Last set state of each channel
+target = [65535, 65535, 65535, 65535]  # Where the ramp is heading
+hold = [0, 0, 0, 0]  # monotonic_ns until which a jolt holds the channel
+ramp = [None, None, None, None]  # Profile table the channel is walking
+ramp_pos = [0, 0, 0, 0]  # Steps taken
+ramp_steps = [0, 0, 0, 0]  # Steps the ramp takes
+ramp_from = [65535, 65535, 65535, 65535]  # Duty the ramp started at
 
 # 65535 is stopped, 0 is max
 
+RAMP_TICK_NS = int(RAMP_TICK * 1000000000)
+JOLT_TIME_NS = int(JOLT_TIME * 1000000000)
+last_tick = time.monotonic_ns()
+
+
+# Ramp profiles, shape over 0..1 and its steepest slope, which sets how
+# many steps a ramp takes so that none is bigger than RAMP_INC.
+RAMP_PROFILES = {
+    "linear": (lambda x: x, 1),
+    # Soft start and finish, where the current spikes, for a longer ramp.
+    "scurve": (lambda x: x * x * (3 - 2 * x), 1.5),
+    # Big first steps, slowing down near the target. Suits braking.
+    "exp": (lambda x: (1 - math.exp(-4 * x)) / (1 - math.exp(-4)), 4 / (1 - math.exp(-4))),
+}
+RAMP_ONE = 16384  # Full scale of a profile table, times a duty still a small int
+_ramps = {}  # profile -> array("H") of its shape over 0..RAMP_ONE, one entry per step
+
+
+def _profile():
+    """
+    RAMP_PROFILE sampled once per step of a full scale ramp.
+    Computed once per profile, shorter ramps skip entries and scale them.
+    """
+    res = _ramps.get(RAMP_PROFILE)
+    if res is None:
+        shape, slope = RAMP_PROFILES[RAMP_PROFILE]
+        size = math.ceil(65535 * slope / RAMP_INC)
+        res = array("H", (round(RAMP_ONE * shape(i / size)) for i in range(1, size + 1)))
+        res[-1] = RAMP_ONE  # Land exactly
+        _ramps[RAMP_PROFILE] = res
+    return res
+
 
 # Define motor functions
+def _set(ch: int, value: int) -> None:
+    duty[ch] = value
+    motors[ch].duty_cycle = value
+    ramp[ch] = None
+
+
+def _aim(ch: int, value: int) -> None:
+    """
+    Start a ramp of a channel from where it is to value.
+    """
+    global last_tick
+    if duty == target:  # First ramp after idle, count ticks from now
+        last_tick = time.monotonic_ns()
+    target[ch] = value
+    ramp_from[ch] = duty[ch]
+    ramp_pos[ch] = 0
+    if value == duty[ch]:
+        ramp[ch] = None
+        return
+    table = _profile()
+    ramp[ch] = table
+    ramp_steps[ch] = max(1, (abs(value - duty[ch]) * len(table) + 65534) // 65535)
+
+
 def _sm(right: bool, reverse: bool, value: int) -> None:
     """
-    Ramping speed controller. Madly optimized.
+    Set the ramp target of a motor. Returns immediately,
+    ramp_tick() moves the channel there.
+    The opposite direction channel is released at once.
     """
-    global fls, frs, bls, brs
     if not right:
-        if reverse:
-            fl.duty_cycle = 65535
-            fls = 65535
-            while value < bls:
-                bls -= RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(bls) + "\n\r")
-                bl.duty_cycle = bls
-                time.sleep(RAMP_TICK)
-            while value > bls:
-                bls += RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(bls) + "\n\r")
-                bl.duty_cycle = bls
-                time.sleep(RAMP_TICK)
-        else:
-            bl.duty_cycle = 65535
-            bls = 65535
-            while value < fls:
-                fls -= RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(fls) + "\n\r")
-                fl.duty_cycle = fls
-                time.sleep(RAMP_TICK)
-            while value > fls:
-                fls += RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(fls) + "\n\r")
-                fl.duty_cycle = fls
-                time.sleep(RAMP_TICK)
+        ch, other = (BL, FL) if reverse else (FL, BL)
     else:
-        if reverse:
-            fr.duty_cycle = 65535
-            frs = 65535
-            while value < brs:
-                brs -= RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(brs) + "\n\r")
-                br.duty_cycle = brs
-                time.sleep(RAMP_TICK)
-            while value > brs:
-                brs += RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(brs) + "\n\r")
-                br.duty_cycle = brs
-                time.sleep(RAMP_TICK)
+        ch, other = (BR, FR) if reverse else (FR, BR)
+    target[other] = 65535
+    hold[other] = 0
+    _set(other, 65535)
+    if value != target[ch]:
+        _aim(ch, value)
+
+
+def ramping() -> bool:
+    return duty != target
+
+
+def ramp_tick() -> None:
+    """
+    Ramping speed controller, call on every main loop tick.
+    Walks each channel's profile, one step per RAMP_TICK that passed,
+    never moving a channel more than RAMP_INC per step.
+    """
+    global last_tick
+    now = time.monotonic_ns()
+    if duty == target:  # Idle, do not bank up steps
+        last_tick = now
+        return
+    steps = (now - last_tick) // RAMP_TICK_NS
+    if not steps:
+        return
+    if steps > RAMP_CATCHUP:  # Stalled loop, resume the ramp instead of jumping
+        steps = RAMP_CATCHUP
+        last_tick = now
+    else:
+        last_tick += steps * RAMP_TICK_NS
+    for ch in range(4):
+        table = ramp[ch]
+        if table is None or hold[ch] > now:
+            continue
+        pos = ramp_pos[ch] + steps
+        end = ramp_steps[ch]
+        if pos >= end:
+            want = target[ch]
         else:
-            br.duty_cycle = 65535
-            brs = 65535
-            while value < frs:
-                frs -= RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(frs) + "\n\r")
-                fr.duty_cycle = frs
-                time.sleep(RAMP_TICK)
-            while value > frs:
-                frs += RAMP_INC
-                if DEBUG:
-                    terminal_write("Ramping.. " + str(frs) + "\n\r")
-                fr.duty_cycle = frs
-                time.sleep(RAMP_TICK)
+            # Entry of a full scale ramp at the same point, scaled down
+            offset = table[(pos * len(table) + end - 1) // end - 1]
+            offset = offset * abs(target[ch] - ramp_from[ch]) // RAMP_ONE
+            if target[ch] < ramp_from[ch]:
+                want = ramp_from[ch] - offset
+            else:
+                want = ramp_from[ch] + offset
+        limit = RAMP_INC * steps  # Sampling skips entries, keep the steps even
+        value = duty[ch]
+        if want > value + limit:
+            value += limit
+        elif want < value - limit:
+            value -= limit
+        else:
+            value = want
+        if value == target[ch]:
+            _set(ch, value)
+        else:
+            ramp_pos[ch] = pos
+            duty[ch] = value
+            motors[ch].duty_cycle = value
+        cptrace.log(EV_RAMP, ch, duty[ch])
 
 
 def stop() -> None:
     """
     Stop both motor immediately.
     """
-    global fls, frs, bls, brs
-    fr.duty_cycle = 65535
-    frs = 65535
-    br.duty_cycle = 65535
-    brs = 65535
-    fl.duty_cycle = 65535
-    fls = 65535
-    bl.duty_cycle = 65535
-    bls = 65535
-    if DEBUG:
-        terminal_write("Stopping!\n\r")
+    for ch in range(4):
+        target[ch] = 65535
+        hold[ch] = 0
+        _set(ch, 65535)
+    cptrace.log(EV_STOP)
 
 
 def move(right: bool, percent: int = 0) -> None:
@@ -155,26 +259,16 @@ def move(right: bool, percent: int = 0) -> None:
     Frontend function to set a motor's speed -100% to +100%, defaults to 0%.
     The right boolean sets if it's the left or right motor.
     """
-    snx(3)
     # Limit bind the variable
     percent = max(min(percent, 100), -100)
 
     reverse = percent < 0
     value = int(65535 - ((65535 - MOTOR_MAX) * abs(percent) / 100))
 
-    if DEBUG:
-        terminal_write(
-            "Setting "
-            + ("left" if not right else "right")
-            + " to "
-            + ("" if not reverse else "-")
-            + str(value)
-            + "\n\r"
-        )
+    cptrace.log(EV_MOVE, right, -value if reverse else value)
 
     # return # Use this to test the code without running the motors
     _sm(right, reverse, value)
-    snx(2)
 
 
 def jolt(right: bool, reverse: bool) -> None:
@@ -182,109 +276,446 @@ def jolt(right: bool, reverse: bool) -> None:
     Frontend function to begin motion.
     The right boolean sets if it's the left or right motor.
     The reverse boolean sets direction.
+    Kicks the channel to JOLT_SPD and holds it there for JOLT_TIME,
+    then it ramps to whatever target it has.
     """
-    snx(3)
-    if DEBUG:
-        terminal_write(
-            "Jolting "
-            + ("left" if not right else "right")
-            + " to "
-            + ("" if not reverse else "-")
-            + str(JOLT_SPD)
-            + "\n\r"
-        )
+    cptrace.log(EV_JOLT, right, -JOLT_SPD if reverse else JOLT_SPD)
 
     # return # Use this to test the code without running the motors
-    _sm(left, reverse, JOLT_SPD)
-    time.sleep(JOLT_TIME)
     _sm(right, reverse, 65535)
-    snx(2)
+    ch = (BR if reverse else FR) if right else (BL if reverse else FL)
+    _set(ch, max(JOLT_SPD, MOTOR_MAX))  # Never past MOTOR_MAX
+    _aim(ch, target[ch])  # Ramp from the jolt, once the hold is over
+    hold[ch] = time.monotonic_ns() + JOLT_TIME_NS
 
 
 def is_stopped() -> bool:
-    return fls == frs == bls == brs == 65535
+    return duty == target == [65535, 65535, 65535, 65535]
 
 
 def forward(spd: int = 100) -> None:
-    if is_stopped():
-        jolt()
+    if spd and is_stopped():  # Nothing to kick for a speed of 0
+        jolt(False, spd < 0)
+        jolt(True, spd < 0)
     move(False, spd)
     move(True, spd)
 
 
+# Setpoints received since the last setpoints() call, only the newest
+# for each motor is applied, so a burst of commands cannot pile up lag.
+sp_forward = None  # forward() speed, replaces both sides
+sp_side = [None, None]  # move() speed of the left and right motor
+
+
+def want_forward(spd: int) -> None:
+    global sp_forward
+    sp_forward = spd
+    sp_side[0] = sp_side[1] = None
+
+
+def want_move(right: bool, percent: int) -> None:
+    sp_side[1 if right else 0] = percent
+
+
+def want_stop() -> None:
+    """
+    Stop right away, dropping any setpoint that came before.
+    """
+    global sp_forward
+    sp_forward = sp_side[0] = sp_side[1] = None
+    stop()
+
+
+def setpoints() -> None:
+    """
+    Apply the newest setpoints, then forget them.
+    """
+    global sp_forward
+    if sp_forward is not None:
+        forward(sp_forward)
+        sp_forward = None
+    for side in range(2):
+        if sp_side[side] is not None:
+            move(bool(side), sp_side[side])
+            sp_side[side] = None
+
+
 # Wi-Fi handling
+stored_networks = table("IWD")  # ssid -> password, one read of settings.toml
+last_network = fetch_many(["ssid", "channel", "bssid"], "IWD_LAST")  # Last that worked
+joined = None  # (ssid, channel, bssid hex) we got on
+
+
+def wifi_connect(ssid: str, channel: int = 0, bssid=None) -> bool:
+    try:
+        wifi.radio.connect(ssid, stored_networks[ssid], channel=channel, bssid=bssid)
+    except:
+        pass
+    return wifi.radio.connected
+
+
+# Go straight for the last network, no scan
+if last_network[0] in stored_networks and not wifi.radio.connected:
+    if DEBUG:
+        print("Trying to connect to the last Wi-Fi, " + last_network[0])
+    if wifi_connect(
+        last_network[0],
+        last_network[1] or 0,
+        unhexlify(last_network[2]) if last_network[2] else None,
+    ):
+        joined = tuple(last_network)
+
 for i in range(3):  # Retry wifi conn 3 times
     if not wifi.radio.connected:
-        stored_networks = keys("IWD")
         if stored_networks and DEBUG:
             print("Trying to connect to Wi-Fi with `settings.toml`. (" + str(i) + "/3)")
 
+        # Known networks in range, strongest first
         available_networks = []
-        for i in wifi.radio.start_scanning_networks():
-            available_networks.append(i.ssid)
+        for net in wifi.radio.start_scanning_networks():
+            if net.ssid in stored_networks:
+                available_networks.append(net)
         wifi.radio.stop_scanning_networks()
-        for i in stored_networks:
-            if i in available_networks:
-                try:
-                    wifi.radio.connect(i, fetch(i, "IWD"))
-                    if wifi.radio.connected:
-                        if DEBUG:
-                            print("Successfully connected to " + i)
-                            snx(2)
-                        break
-                except:
-                    pass
+        available_networks.sort(key=lambda net: net.rssi, reverse=True)
+        for net in available_networks:
+            if wifi_connect(net.ssid, net.channel, net.bssid):
+                joined = (net.ssid, net.channel, hexlify(net.bssid).decode())
+                if DEBUG:
+                    print("Successfully connected to " + net.ssid)
+                    snx(2)
+                break
+        del available_networks
     else:
         break
 
-if not wifi.radio.connected:
-    if DEBUG:
-        print("Wifi was not connected!")
-        exit(1)
+# Remember where we got on, only rewriting settings.toml if it changed
+if joined and list(joined) != last_network:
+    try:
+        with edit() as doc:
+            doc.put("ssid", joined[0], "IWD_LAST")
+            doc.put("channel", joined[1], "IWD_LAST")
+            doc.put("bssid", joined[2], "IWD_LAST")
+    except OSError:
+        pass  # Read only while mounted over USB
 
-LOCAL_IP = str(wifi.radio.ipv4_address) # Our current IPv4 address
+if not wifi.radio.connected and DEBUG:
+    print("Wifi was not connected, retrying with the server connection")
 
 # Socket comms
 pool = SocketPool(wifi.radio)
-sock = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
-sock.settimeout(8) # Connection / Transmission timeout
-
-print("Connecting.. ", end="")
-try:
-    snx(4)
-    sock.connect((HOST, 5080)) # Connect to server
-    snx(3)
-except Exception as err:
-    print("FAIL!\n")
-    print_exception(err)
-    exit(1)
-print("Done!")
+sock = None  # Server connection, None while the link is down
+conn = None  # Connection being set up by sock_open()
+conn_deadline = 0  # monotonic_ns at which it gives up
+CONNECT_TIMEOUT_NS = int(CONNECT_TIMEOUT * 1000000000)
+rx_last = 0  # monotonic_ns of the last data from the server
+pinged = False  # A ping is out since then
+PING_NS = int(PING_TIME * 1000000000)
+LINK_TIMEOUT_NS = int(LINK_TIMEOUT * 1000000000)
 
 rx_buf = bytearray(512)  # Receive buffer, static allocation
+rx_mv = memoryview(rx_buf)
+rx_len = 0  # Bytes of an unfinished frame at the start of rx_buf
+RECV_BURST = 8  # Reads per sock_recv() at most, the other tasks need to run too
+argv = array("l", (0, 0, 0, 0))  # Numeric arguments of the frame being handled
+BCAST = b"0.0.0.0"
+
+# Binary control packets, network byte order:
+# magic, opcode, target ipv4, left, right, sequence number
+PKT_FMT = ">BBIhhH"
+PKT_SIZE = 12
+PKT_MAGIC = 0xA5  # Never starts a text frame
+PKT_KEEP = -32768  # Speed that leaves the motor as is
+OP_STOP = 0
+OP_MOVE = 1  # left and right speed, -100 to 100
+OP_FORWARD = 2  # left is the speed of both
+
+
+def local_ip() -> None:
+    """
+    Pick up our IPv4 address, in the forms the receive path compares against.
+    """
+    global LOCAL_IP, LOCAL, LOCAL_NUM
+    addr = wifi.radio.ipv4_address
+    LOCAL_IP = str(addr) if addr is not None else "0.0.0.0"  # Off the network, no target matches
+    LOCAL = bytes(LOCAL_IP, "ascii")
+    LOCAL_NUM = 0
+    for i in LOCAL_IP.split("."):
+        LOCAL_NUM = LOCAL_NUM << 8 | int(i)
 
 
-def sock_recv():
-    # Receives data from the server, parses the IPv4 address and data.
-    try:
-        size = sock.recv_into(rx_buf)
-    except:
+local_ip()
+
+
+def _args(buf, pos: int, end: int) -> int:
+    """
+    Parse the space separated integers in buf[pos:end] into argv.
+    Returns how many, or -1 if one is not a number.
+    """
+    argc = 0
+    while pos < end:
+        c = buf[pos]
+        if c == 32:  # " "
+            pos += 1
+            continue
+        if argc == len(argv):
+            return -1
+        neg = c == 45  # "-"
+        if neg:
+            pos += 1
+        value = 0
+        digits = 0
+        while pos < end and buf[pos] != 32:
+            c = buf[pos] - 48
+            if not 0 <= c <= 9:
+                return -1
+            value = value * 10 + c
+            digits += 1
+            pos += 1
+        if not digits:
+            return -1
+        argv[argc] = -value if neg else value
+        argc += 1
+    return argc
+
+
+def _command(buf, pos: int, end: int) -> None:
+    """
+    Run the "command args" at buf[pos:end] through the commands table.
+    """
+    while pos < end and buf[pos] == 32:
+        pos += 1
+    word = buf.find(b" ", pos, end)
+    if word < 0:
+        word = end
+    for name, handler in commands:
+        if word - pos == len(name) and buf.startswith(name, pos):
+            handler(_args(buf, word, end))
+            return
+    print("Unknown command: " + bytes(buf[pos:word]).decode("utf-8"))
+
+
+def _frame(start: int, end: int) -> None:
+    """
+    Handle one "[ip] command args" frame at rx_buf[start:end].
+    Only broadcast and targetted frames are accepted.
+    """
+    while end > start and (rx_buf[end - 1] == 13 or rx_buf[end - 1] == 32):
+        end -= 1  # Trailing "\r" / " "
+    if end - start < 3 or rx_buf[start] != 91:  # "["
+        return
+    close = rx_buf.find(b"]", start, end)
+    size = close - start - 1
+    if not (
+        (size == len(BCAST) and rx_buf.startswith(BCAST, start + 1))
+        or (size == len(LOCAL) and rx_buf.startswith(LOCAL, start + 1))
+    ):
         return
-    raw = rx_buf[:size].decode("utf-8")
+    _command(rx_buf, close + 1, end)
 
-    if "]" in raw:
-        ip, data = raw.split("]", 1)
-        ip = ip.strip("[")  # Remove the leading '['
-        data_list = data.strip().split(" ")  # Split the remaining data by spaces
-        return ip, data_list
-    else:
-        raise ValueError("Invalid data format")
+
+def _packet(start: int) -> None:
+    """
+    Handle one binary control packet at rx_buf[start].
+    Stale packets are dropped by the server, which knows the sender of
+    each, the one connection to it keeps the rest in order.
+    """
+    magic, op, ip, left, right, seq = unpack_from(PKT_FMT, rx_buf, start)
+    if ip and ip != LOCAL_NUM:
+        return
+    if op == OP_STOP:
+        want_stop()
+    elif op == OP_MOVE:
+        if left != PKT_KEEP:
+            want_move(False, left)
+        if right != PKT_KEEP:
+            want_move(True, right)
+    elif op == OP_FORWARD:
+        want_forward(left)
+
+
+def sock_recv() -> int:
+    """
+    Receives everything the server sent so far and handles every complete
+    line and binary packet in it, then applies the newest setpoints.
+    A partial frame is kept at the start of rx_buf for the next call.
+    Returns the frames handled.
+    """
+    global rx_len, rx_last, pinged
+    frames = 0
+    for _ in range(RECV_BURST):
+        if sock is None:
+            break
+        try:
+            size = sock.recv_into(rx_mv[rx_len:])
+        except OSError as err:
+            if err.errno != EAGAIN and err.errno != ETIMEDOUT:  # Not just "nothing yet"
+                sock_close()
+            break
+        if not size:  # Closed by the server
+            sock_close()
+            break
+        rx_last = time.monotonic_ns()
+        pinged = False
+        snx(3)
+        end = rx_len + size
+        start = 0
+        while start < end:
+            if rx_buf[start] == PKT_MAGIC:
+                if end - start < PKT_SIZE:
+                    break
+                _packet(start)
+                start += PKT_SIZE
+            else:
+                nl = rx_buf.find(b"\n", start, end)
+                if nl < 0:
+                    break
+                _frame(start, nl)
+                start = nl + 1
+            frames += 1
+        rx_len = end - start
+        if rx_len == len(rx_buf):  # A line longer than the buffer, drop it
+            rx_len = 0
+        elif start and rx_len:
+            rx_buf[:rx_len] = rx_mv[start:end]
+    if frames:
+        setpoints()
+    return frames
 
 
 def sock_send(data: str, target: str = "0.0.0.0") -> int:
     # Sends a set of data along with an ip header, defaulting to broadcast.
-    return sock.send(bytes(f"[{target}] {data}", "UTF-8"))
+    if sock is None:
+        return 0
+    try:
+        return sock.send(bytes(f"[{target}] {data}\n", "UTF-8"))
+    except OSError as err:
+        if err.errno != EAGAIN and err.errno != ETIMEDOUT:
+            sock_close()
+        return 0
+
+
+def sock_open():
+    """
+    Connect to the server and sign in, rejoining Wi-Fi first if it dropped.
+    Never waits for the connection, returns None while it is on the way,
+    call again after a yield. False if it could not, the caller backs off.
+    """
+    global sock, conn, conn_deadline, rx_len, rx_last, pinged, commanding
+    if conn is None:
+        if not wifi.radio.connected:
+            for ssid in [joined[0]] if joined else stored_networks:
+                if wifi_connect(ssid):
+                    break
+            else:
+                return False
+            local_ip()
+        snx(4)
+        conn = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
+        conn.settimeout(0)  # Never wait on the socket, the other tasks need the time
+        conn_deadline = time.monotonic_ns() + CONNECT_TIMEOUT_NS
+    try:
+        conn.connect((HOST, 5080))  # Connect to server
+    except OSError as err:
+        waiting = err.errno in (EINPROGRESS, EALREADY, EAGAIN, ETIMEDOUT)
+        if waiting and time.monotonic_ns() < conn_deadline:
+            return None
+        if err.errno != EISCONN:  # Else it got there since the last call
+            if DEBUG:
+                print("Connecting failed: " + ("timed out" if waiting else str(err)))
+            conn.close()
+            conn = None
+            return False
+    sock = conn
+    conn = None
+    snx(3)
+    rx_len = 0
+    rx_last = time.monotonic_ns()
+    pinged = False
+    commanding = False
+    sock_send("slave")
+    if BINARY:
+        sock_send("binary")
+    sock_send("vote")
+    return sock is not None
+
+
+def sock_close() -> None:
+    """
+    Drop the server connection, the motors stay stopped until it is back.
+    """
+    global sock
+    if sock is None:
+        return
+    try:
+        sock.close()
+    except OSError:
+        pass
+    sock = None
+    want_stop()
+
+
+def link_check() -> None:
+    """
+    Catch a link that died without a word, the radio dropping or the server
+    going away with the connection half open, which only ever reads EAGAIN.
+    Pings a quiet server and drops the link when even that goes unanswered,
+    instead of leaving the motors on their last setpoint.
+    """
+    global pinged
+    quiet = time.monotonic_ns() - rx_last
+    if not wifi.radio.connected or quiet > LINK_TIMEOUT_NS:
+        if DEBUG:
+            print("Lost the server")
+        sock_close()
+    elif quiet > PING_NS and not pinged:
+        pinged = True
+        sock_send("ping")
+
+
+# Command handlers, get the number of numeric arguments parsed into argv
+def _on_vote(argc: int) -> None:
+    global commanding
+    # Give the server a urandom byte
+    sock_send(str(int.from_bytes(urandom(1), "big")))
+    commanding = False  # Reset since a new voting proccess started
 
 
+def _on_master(argc: int) -> None:
+    global commanding
+    commanding = True
+    print("I am king!")
+
+
+def _on_forward(argc: int) -> None:
+    if argc >= 1:
+        want_forward(argv[0])
+
+
+def _on_move(argc: int) -> None:
+    if argc >= 2:
+        want_move(bool(argv[0]), argv[1])
+
+
+def _on_stop(argc: int) -> None:
+    want_stop()
+
+
+def _on_ignore(argc: int) -> None:
+    pass
+
+
+commands = (
+    (b"move", _on_move),
+    (b"forward", _on_forward),
+    (b"stop", _on_stop),
+    (b"vote", _on_vote),
+    (b"master", _on_master),
+    (b"Unauthorized", _on_ignore),
+    (b"Authentication", _on_ignore),
+    (b"binary", _on_ignore),  # The server agreed to send packets
+    (b"pong", _on_ignore),  # Answer to link_check()
+)
+
 # Terminal muxer, obsolete
 def terminal_waiting() -> int:
     res = 0
@@ -301,41 +732,98 @@ def terminal_write(data: str) -> None:
         usbcon.write(data.encode("UTF-8"))
 
 
+con_buf = bytearray(64)  # USB console line buffer
+con_mv = memoryview(con_buf)
+con_len = 0
+
+
+def console_recv() -> None:
+    """
+    Run the lines typed on the USB console as commands, without the [ip].
+    """
+    global con_len
+    waiting = usbcon.in_waiting
+    if not waiting:
+        return
+    size = min(waiting, len(con_buf) - con_len)
+    con_len += usbcon.readinto(con_mv[con_len : con_len + size])
+    start = 0
+    for i in range(con_len):
+        if con_buf[i] == 10 or con_buf[i] == 13:  # "\n" / "\r"
+            if i > start:
+                _command(con_buf, start, i)
+            start = i + 1
+    setpoints()
+    con_len -= start
+    if con_len == len(con_buf):  # A line longer than the buffer, drop it
+        con_len = 0
+    elif start and con_len:
+        con_buf[:con_len] = con_mv[start : start + con_len]
+
+
+# Cooperative tasks, each yields as soon as it has nothing to do
+
+
+async def net_task() -> None:
+    delay = BACKOFF_MIN
+    while True:
+        if sock is None:
+            res = sock_open()
+            if res:
+                if DEBUG:
+                    print("Connected to the server")
+                delay = BACKOFF_MIN
+            elif res is None:  # Still connecting
+                await asyncio.sleep(LOOP_TICK)
+            else:
+                # Capped exponential backoff, jittered so the robots spread out
+                await asyncio.sleep(delay / 2 + delay * urandom(1)[0] / 510)
+                delay = min(delay * 2, BACKOFF_MAX)
+        elif sock_recv():
+            snx(2)
+            await asyncio.sleep(0)  # More may be queued
+        else:
+            link_check()
+            await asyncio.sleep(LOOP_TICK)
+
+
+async def motor_task() -> None:
+    while True:
+        ramp_tick()
+        await asyncio.sleep(RAMP_TICK if ramping() else LOOP_TICK)
+
+
+async def console_task() -> None:
+    while True:
+        console_recv()
+        if cptrace.pending() and not ramping():
+            # Nothing moving, spare time to print traces
+            cptrace.drain(terminal_write)
+        await asyncio.sleep(LOOP_TICK)
+
+
+async def status_task() -> None:
+    while True:
+        cptrace.log(EV_STATUS, commanding, is_stopped())
+        snx(1)  # Heartbeat
+        await asyncio.sleep(0.05)
+        snx(2)
+        await asyncio.sleep(STATUS_TIME)
+
+
+async def main() -> None:
+    await asyncio.gather(net_task(), motor_task(), console_task(), status_task())
+
+
 if DEBUG:
     print("Running main loop")
 
 # Main program loop
 
 commanding = False  # We are king
-sock_send("slave")
-sock_send("vote")
 
 try:
-    while True:
-        try:
-            ip, cmd = sock_recv()
-            snx(3)
-            if ip in ["0.0.0.0", LOCAL_IP]:  # Only accept bcast / targetted packets
-                if cmd[0] == "vote":
-                    # Give the server a urandom byte
-                    sock_send(str(int.from_bytes(urandom(1), "big")))
-                    commanding = False # Reset since a new voting proccess started
-                elif cmd[0] == "master":
-                    commanding = True
-                    print("I am king!")
-                elif cmd[0] == "forward":
-                    forward(int(cmd[1]))
-                elif cmd[0] == "move":
-                    move(bool(int(cmd[1])), int(cmd[2]))
-                elif cmd[0] == "stop":
-                    stop()
-                elif cmd[0] == "Unauthorized":
-                    pass
-                else:
-                    print(f"Unknown command: {cmd[0]}")
-            snx(2)
-        except TypeError:
-            pass
+    asyncio.run(main())
 except Exception as err:
     # Catchall, reset if no usb
     if usbcon.connected:
@@ -0,0 +1,20 @@
+"""
+Pin names of an ESP32-S3 board.
+"""
+
+
+class Pin:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return "board." + self.name
+
+
+for _n in range(49):
+    globals()["IO" + str(_n)] = Pin("IO" + str(_n))
+del _n
+
+NEOPIXEL = Pin("NEOPIXEL")
+LED = Pin("LED")
+BUTTON = Pin("BUTTON")
@@ -0,0 +1,86 @@
+"""
+The clock the emulated firmware reads through time.monotonic*().
+
+Real time by default. With VIRTUAL set, reading the clock never moves it,
+only waiting does: the event loop from loop() runs whatever is ready and
+then jumps to its next timer instead of sleeping, and time.sleep() skips
+ahead. Ramp timings and logged timestamps follow the firmware's schedule,
+however fast the host is.
+"""
+
+import asyncio
+import math
+import selectors
+import sys
+import time as _time
+import types
+
+VIRTUAL = False
+
+_now = 0
+
+
+def monotonic_ns() -> int:
+    return _now if VIRTUAL else _time.monotonic_ns()
+
+
+def monotonic() -> float:
+    return monotonic_ns() / 1000000000
+
+
+def advance(ns: int) -> None:
+    """
+    Move virtual time forward.
+    """
+    global _now
+    _now += ns
+
+
+def sleep(seconds: float) -> None:
+    if VIRTUAL:
+        advance(math.ceil(seconds * 1000000000))
+    else:
+        _time.sleep(seconds)
+
+
+class _Selector(selectors.DefaultSelector):
+    """
+    Polls instead of waiting, and moves virtual time to where the wait would end.
+    """
+
+    def select(self, timeout=None):
+        if timeout is None:  # No timer, only I/O can wake the loop
+            return super().select()
+        ready = super().select(0)
+        if not ready and timeout > 0:
+            advance(math.ceil(timeout * 1000000000))
+        return ready
+
+
+class _Loop(asyncio.SelectorEventLoop):
+    def __init__(self) -> None:
+        super().__init__(_Selector())
+
+    def time(self) -> float:
+        return _now / 1000000000
+
+
+def loop() -> asyncio.AbstractEventLoop:
+    """
+    A new event loop on this clock, for asyncio.Runner(loop_factory=).
+    """
+    return _Loop() if VIRTUAL else asyncio.new_event_loop()
+
+
+def install() -> None:
+    """
+    Replace the time module for whatever imports it from now on.
+    Modules that already hold the real one, asyncio included, keep it,
+    run the firmware's event loop from loop() to have it on this clock.
+    """
+    mod = types.ModuleType("time")
+    mod.__dict__.update(_time.__dict__)
+    mod.monotonic_ns = monotonic_ns
+    mod.monotonic = monotonic
+    mod.sleep = sleep
+    sys.modules["time"] = mod
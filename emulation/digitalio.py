@@ -0,0 +1,40 @@
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class DriveMode:
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DigitalInOut:
+    def __init__(self, pin) -> None:
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.drive_mode = DriveMode.PUSH_PULL
+        self.pull = None
+        self.value = False
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL) -> None:
+        self.direction = Direction.OUTPUT
+        self.drive_mode = drive_mode
+        self.value = value
+
+    def switch_to_input(self, pull=None) -> None:
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def deinit(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.deinit()
@@ -0,0 +1,8 @@
+pixels = {}  # pin name -> last GRB bytes written
+writes = 0
+
+
+def neopixel_write(digitalinout, buf) -> None:
+    global writes
+    pixels[digitalinout.pin.name] = bytes(buf)
+    writes += 1
@@ -0,0 +1,33 @@
+"""
+PWM outputs that record every duty cycle write.
+"""
+
+import clock
+
+LOG_MAX = 1000000  # Writes kept, the oldest are dropped past this
+
+log = []  # (monotonic_ns, pin name, duty_cycle)
+
+
+class PWMOut:
+    def __init__(self, pin, *, duty_cycle=0, frequency=500, variable_frequency=False) -> None:
+        self.pin = pin
+        self.frequency = frequency
+        self.variable_frequency = variable_frequency
+        self.duty_cycle = duty_cycle
+
+    @property
+    def duty_cycle(self) -> int:
+        return self._duty
+
+    @duty_cycle.setter
+    def duty_cycle(self, value: int) -> None:
+        if not 0 <= value <= 65535:
+            raise ValueError("duty_cycle must be 0-65535")
+        self._duty = value
+        if len(log) >= LOG_MAX:
+            del log[: LOG_MAX // 2]
+        log.append((clock.monotonic_ns(), self.pin.name, value))
+
+    def deinit(self) -> None:
+        pass
@@ -0,0 +1,213 @@
+"""
+Run the unchanged code.py on CPython, on the stand-in modules next to this file.
+
+The CIRCUITPY drive is a directory (--drive). Its settings.toml gets a
+network when it has none, and every network in [IWD] is in range unless
+--network says otherwise. The server connection goes to --relay, start
+server.c there first. At the end, PWM writes per pin, ramp timings and
+how often the tasks yielded are reported.
+
+    python emulation/run.py --duration 10
+    python emulation/run.py --clock virtual --duration 5 --pwm-log pwm.csv --json
+"""
+
+import argparse
+import json
+import os
+import runpy
+import signal
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [HERE, os.path.join(ROOT, "lib")]
+
+import asyncio  # Before clock.install(), it keeps the real time module
+
+import clock
+
+RAMP_GAP_NS = 100000000  # Writes further apart than this are separate ramps
+
+
+class _Done(BaseException):
+    """
+    Raised by the --duration timer, the firmware only catches Exception.
+    """
+
+
+def mount(drive: str) -> None:
+    """
+    Point the absolute paths cptoml uses at the drive directory.
+    """
+    import cptoml
+
+    def path(p):
+        return os.path.join(drive, p.lstrip("/")) if p.startswith("/") else p
+
+    cptoml.open = lambda p, *args, **kwargs: open(path(p), *args, **kwargs)
+    cptoml.stat = lambda p: os.stat(path(p))
+    cptoml.remove = lambda p: os.remove(path(p))
+    cptoml.rename = lambda a, b: os.rename(path(a), path(b))
+
+
+def networks(specs: list) -> None:
+    """
+    Put the networks in range, SSID[:RSSI[:CHANNEL]] each, or all of [IWD].
+    """
+    import cptoml
+    import wifi
+
+    known = cptoml.table("IWD")
+    wifi.radio.passwords.update(known)
+    for spec in specs or list(known):
+        parts = spec.split(":")
+        net = wifi.Network(parts[0])
+        if len(parts) > 1:
+            net.rssi = int(parts[1])
+        if len(parts) > 2:
+            net.channel = int(parts[2])
+        wifi.radio.networks.append(net)
+
+
+def ramps(log: list) -> dict:
+    """
+    Per pin writes and ramps, a ramp being two or more writes in a row
+    stepping the same way, each less than RAMP_GAP_NS after the previous.
+    """
+    res = {}
+    runs = {}  # pin -> [first ns, last ns, last duty, direction, steps]
+    times = {}  # pin -> ramp durations in ms
+
+    def end(pin, run):
+        if run[4] > 1:
+            times[pin].append((run[1] - run[0]) / 1000000)
+
+    for ns, pin, duty in log:
+        if pin not in res:
+            res[pin] = {"writes": 0}
+            times[pin] = []
+            runs[pin] = [ns, ns, duty, 0, 0]
+        res[pin]["writes"] += 1
+        run = runs[pin]
+        direction = (duty > run[2]) - (duty < run[2])
+        if direction and direction == run[3] and ns - run[1] <= RAMP_GAP_NS:
+            run[1], run[2], run[4] = ns, duty, run[4] + 1
+        else:
+            end(pin, run)
+            runs[pin] = [ns, ns, duty, direction, 1 if direction else 0]
+    for pin, run in runs.items():
+        end(pin, run)
+        row = res[pin]
+        row["ramps"] = len(times[pin])
+        row["ramp_ms_mean"] = round(sum(times[pin]) / row["ramps"], 3) if times[pin] else None
+        row["ramp_ms_max"] = round(max(times[pin]), 3) if times[pin] else None
+    return res
+
+
+def print_report(report: dict) -> None:
+    print("\n--- emulation report ---")
+    for key, value in report.items():
+        if key != "pwm":
+            print(f"{key:>16}: {value}")
+    print(f"{'pin':>8} {'writes':>8} {'ramps':>6} {'mean ms':>9} {'max ms':>9}")
+    for pin, row in sorted(report["pwm"].items()):
+        print(
+            f"{pin:>8} {row['writes']:>8} {row['ramps']:>6} "
+            f"{str(row['ramp_ms_mean']):>9} {str(row['ramp_ms_max']):>9}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--firmware", default=os.path.join(ROOT, "code.py"), help="code.py")
+    parser.add_argument("--drive", help="CIRCUITPY directory, a temporary one by default")
+    parser.add_argument("--relay", default="127.0.0.1:5080", help="server host:port")
+    parser.add_argument("--ip", default="127.0.0.1", help="address wifi reports")
+    parser.add_argument(
+        "--network", action="append", default=[], help="SSID[:RSSI[:CHANNEL]] in range"
+    )
+    parser.add_argument("--clock", choices=["real", "virtual"], default="real")
+    parser.add_argument("--duration", type=float, default=0, help="seconds, 0 runs until ^C")
+    parser.add_argument("--pwm-log", help="write every PWM write to this CSV")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    drive = args.drive or tempfile.mkdtemp(prefix="circuitpy_")
+    settings = os.path.join(drive, "settings.toml")
+    if not os.path.exists(settings):
+        with open(settings, "w") as f:
+            f.write('[IWD]\nemulated = "emulated"\n')
+
+    clock.VIRTUAL = args.clock == "virtual"
+    clock.install()
+
+    import neopixel_write
+    import pwmio
+    import socketpool
+    import wifi
+
+    host, port = args.relay.rsplit(":", 1)
+    socketpool.ROUTE = (host, int(port))
+    wifi.ADDRESS = args.ip
+    mount(drive)
+    networks(args.network)
+
+    # Every asyncio.sleep() is a task yielding, the closest to a loop rate
+    yields = [0]
+    real_sleep = asyncio.sleep
+
+    def sleep(delay, result=None):
+        yields[0] += 1
+        return real_sleep(delay, result)
+
+    asyncio.sleep = sleep
+
+    # The firmware's event loop runs on the emulated clock
+    def run(main, *, debug=None):
+        with asyncio.Runner(debug=debug, loop_factory=clock.loop) as runner:
+            return runner.run(main)
+
+    asyncio.run = run
+
+    def done(signum, frame):
+        raise _Done()
+
+    if args.duration:
+        signal.signal(signal.SIGALRM, done)
+        signal.setitimer(signal.ITIMER_REAL, args.duration)
+
+    ended = "duration"
+    start = time.perf_counter()
+    try:
+        runpy.run_path(args.firmware, run_name="__main__")
+        ended = "returned"
+    except _Done:
+        pass
+    except KeyboardInterrupt:
+        ended = "interrupted"
+    except SystemExit as err:
+        ended = "exit " + str(err.code)
+    elapsed = time.perf_counter() - start
+    signal.setitimer(signal.ITIMER_REAL, 0)
+
+    if args.pwm_log:
+        with open(args.pwm_log, "w") as f:
+            f.write("ns,pin,duty\n")
+            for ns, pin, duty in pwmio.log:
+                f.write(f"{ns},{pin},{duty}\n")
+
+    report = {
+        "ended": ended,
+        "seconds": round(elapsed, 3),
+        "yields_per_s": round(yields[0] / elapsed) if elapsed else 0,
+        "wifi_scans": wifi.radio.scans,
+        "wifi_connects": wifi.radio.connects,
+        "led_writes": neopixel_write.writes,
+        "pwm": ramps(pwmio.log),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
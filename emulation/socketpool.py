@@ -0,0 +1,37 @@
+"""
+SocketPool on top of the host's sockets.
+"""
+
+import socket as _socket
+
+ROUTE = None  # (host, port) every connect() goes to instead, e.g. a local relay
+
+
+class Socket(_socket.socket):
+    def connect(self, address) -> None:
+        super().connect(ROUTE or address)
+
+
+class SocketPool:
+    AF_INET = _socket.AF_INET
+    AF_INET6 = _socket.AF_INET6
+    SOCK_STREAM = _socket.SOCK_STREAM
+    SOCK_DGRAM = _socket.SOCK_DGRAM
+    SOCK_RAW = _socket.SOCK_RAW
+    IPPROTO_TCP = _socket.IPPROTO_TCP
+    TCP_NODELAY = _socket.TCP_NODELAY
+    SOL_SOCKET = _socket.SOL_SOCKET
+    SO_REUSEADDR = _socket.SO_REUSEADDR
+    EAI_NONAME = _socket.EAI_NONAME
+
+    gaierror = _socket.gaierror
+    timeout = TimeoutError
+
+    def __init__(self, radio) -> None:
+        self.radio = radio
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0) -> Socket:
+        return Socket(family, type, proto)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0) -> list:
+        return _socket.getaddrinfo(host, port, family, type, proto, flags)
@@ -0,0 +1,58 @@
+"""
+The USB console, on the host's stdin / stdout.
+"""
+
+import fcntl
+import os
+import select
+import struct
+import sys
+import termios
+
+
+class Serial:
+    def __init__(self, infile, outfile) -> None:
+        self._in = infile
+        self._out = outfile
+        self.timeout = 1
+        self.write_timeout = None
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    @property
+    def in_waiting(self) -> int:
+        try:
+            if self._in is None or not select.select([self._in], [], [], 0)[0]:
+                return 0
+        except (OSError, ValueError):  # Closed or not selectable
+            return 0
+        try:
+            res = fcntl.ioctl(self._in.fileno(), termios.FIONREAD, b"\0\0\0\0")
+            return struct.unpack("i", res)[0] or 1  # Readable with 0 is end of file
+        except OSError:
+            return 1  # At least, the reads below never block for more
+
+    def read(self, size=1) -> bytes:
+        return os.read(self._in.fileno(), size) if self.in_waiting else b""
+
+    def readinto(self, buf) -> int:
+        data = self.read(len(buf))
+        buf[: len(data)] = data
+        return len(data)
+
+    def write(self, data) -> int:
+        self._out.buffer.write(data)
+        self._out.flush()
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+
+console = Serial(sys.stdin, sys.stdout)
+data = None  # Not enabled
@@ -0,0 +1,78 @@
+"""
+A simulated radio, the networks in range are set by whoever runs the firmware.
+"""
+
+import ipaddress
+import os
+
+ADDRESS = "127.0.0.1"  # What ipv4_address reports once connected
+
+
+class Network:
+    def __init__(self, ssid: str, rssi: int = -50, channel: int = 6, bssid=None) -> None:
+        self.ssid = ssid
+        self.rssi = rssi
+        self.channel = channel
+        self.bssid = bssid or os.urandom(6)
+        self.country = ""
+        self.authmode = ()
+
+
+class Radio:
+    def __init__(self) -> None:
+        self.networks = []  # Network in range
+        self.passwords = {}  # ssid -> password the access point wants, None takes any
+        self.enabled = True
+        self.hostname = "cpy-emulated"
+        self.connects = 0  # connect() calls, for comparing reconnect strategies
+        self.scans = 0
+        self._joined = None
+        self._scanning = False
+
+    @property
+    def connected(self) -> bool:
+        return self._joined is not None
+
+    @property
+    def ipv4_address(self):
+        return ipaddress.IPv4Address(ADDRESS) if self.connected else None
+
+    @property
+    def ap_info(self):
+        return self._joined
+
+    def start_scanning_networks(self, *, start_channel=1, stop_channel=11):
+        if self._scanning:
+            raise RuntimeError("Already scanning for wifi networks")
+        self._scanning = True
+        self.scans += 1
+        return iter(
+            [net for net in self.networks if start_channel <= net.channel <= stop_channel]
+        )
+
+    def stop_scanning_networks(self) -> None:
+        self._scanning = False
+
+    def connect(self, ssid, password="", *, channel=0, bssid=None, timeout=None) -> None:
+        self.connects += 1
+        for net in self.networks:
+            if (
+                net.ssid == ssid
+                and (not channel or net.channel == channel)
+                and (not bssid or net.bssid == bytes(bssid))
+            ):
+                want = self.passwords.get(ssid)
+                if want is not None and want != password:
+                    raise ConnectionError("Authentication failure")
+                self._joined = net
+                return
+        raise ConnectionError("No network with that ssid")
+
+    def drop(self) -> None:
+        """
+        Lose the access point, as if it went out of range.
+        """
+        self._joined = None
+
+
+radio = Radio()
@@ -1,3 +1,22 @@
+from os import remove, rename, stat
+from struct import pack, unpack_from
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+CACHE_MAX = 4096  # Largest file (bytes) kept parsed in RAM, 0 disables the cache
+CACHE_HASH = False  # Also checksum the file, for boards where mtime is unreliable
+JOURNAL = False  # put() / delete() append to a journal instead of rewriting the file
+JOURNAL_MAX = 1024  # Journal size (bytes) past which it is folded into the toml
+SNAPSHOT = False  # Keep a binary snapshot of the parsed file next to it
+
+_cache = {}  # toml path -> (stamp, data)
+_SNAP_MAGIC = b"CPTS"
+_SNAP_VERSION = 2
+
+
 def _prepareline(line) -> str:
     """
     Remove comments from a line buffer.
@@ -40,7 +59,15 @@ def _linevalue(line):
     Get the value out of a line.
     """
     result = _prepareline(line)
-    result = result[result.find("=") + 1 :]
+    result = _parsevalue(result[result.find("=") + 1 :])
+    del line
+    return result
+
+
+def _parsevalue(result):
+    """
+    Decode the value part of an already prepared line.
+    """
     result = _prepareline(result)  # for spaces
 
     if not len(result):
@@ -61,44 +88,15 @@ def _linevalue(line):
         elif result[0].isdigit() and ("e" in result):  # notation
             exec(f"result = int({result})")
         else:
-            del line, result
+            del result
             raise TypeError("Invalid value.")
     elif result == "true":  # bools
         result = True
     elif result == "false":
         result = False
     else:
-        del line, result
+        del result
         raise TypeError("Invalid value.")
-    del line
-    return result
-
-
-def _linefind(buf, key, start=0) -> int:
-    """
-    Find key buffer index.
-    Use start to place into the correct table.
-
-    Returns -1 when not found.
-    """
-    result = -1
-    tm = start
-    q = True
-    while q:
-        try:
-            tml = _prepareline(buf[tm])
-        except IndexError:
-            q = False
-        if q and (tml.startswith(key + "=") or tml.startswith(key + " =")):
-            result = tm
-            q = False
-        elif q and ((len(buf) == tm + 1) or tml.startswith("[")):
-            q = False
-        del tml
-        tm += 1
-        if not q:
-            break
-    del buf, start, key, tm, q
     return result
 
 
@@ -110,14 +108,14 @@ def _linemake(key, value, comment=None) -> str:
     result = key + " = "
     if isinstance(value, str):
         result += '"' + value.replace("\n", "\\n") + '"'  # make raw
+    elif isinstance(value, bool):  # Before int, bool is an int subclass
+        result += str(value).lower()
     elif isinstance(value, int) or isinstance(value, float):
         if str(value) != "inf":
             result += str(value)
         else:
             del result, key, value, comment
             raise TypeError("Value infinite")
-    elif isinstance(value, bool):
-        result += str(value).lower()
     else:
         del result, key, value, comment
         raise TypeError("Unsupported type for toml")
@@ -129,105 +127,603 @@ def _linemake(key, value, comment=None) -> str:
 
 def _applyformatting(data) -> list:
     """
-    Apply formatting.
+    Apply formatting, in a single pass into a new list.
 
     - Spaces it out subtables.
     - Removes blank tables.
     """
-    bb = False  # Back to back subtable decleration
-    el = False  # no element in subtable
-    for i in range(len(data) - 1, 0, -1):
-        if data[i].startswith("["):
-            if (bb is False) and el:
-                bb = True
-                el = False
-                data.insert(i, "")
-            else:  # The current subtable should be removed!
-                data.pop(i)
-                # Should remain true.
+    res = []
+    header = None  # Subtable decleration, kept once an element follows
+    for i in range(len(data)):
+        if i and data[i].startswith("["):
+            header = data[i]  # A previous one had no elements, drop it
         else:
-            if bb:
-                bb = False
-            if not el:
-                el = True
-    del bb, el
-    return data
+            if header is not None:
+                res.append("")
+                res.append(header)
+                header = None
+            res.append(data[i])
+    del header, data
+    return res
 
 
-def _tablefind(buf, subtable) -> int:
+def _checksum(toml) -> int:
+    """
+    Cheap crc of the file contents, read in small chunks.
     """
-    Find subtable buffer index.
+    buf = bytearray(256)
+    mv = memoryview(buf)
+    res = 0
+    with open(toml, "rb") as tomlf:
+        while True:
+            size = tomlf.readinto(buf)
+            if not size:
+                break
+            if crc32 is not None:
+                res = crc32(mv[:size], res)
+            else:  # No binascii, fall back to a plain rolling hash
+                for i in range(size):
+                    res = (res * 31 + buf[i]) & 0xFFFFFFFF
+    del buf, mv
+    return res
 
-    Returns -1 when not found.
+
+def _stamp(toml) -> tuple:
+    """
+    Identity of the file on disk, used to validate the cache.
+
+    Size and mtime of the file and its journal,
+    plus a checksum when CACHE_HASH is set.
+    Raises OSError if the file is missing.
     """
-    result = -1
-    tm = 0
-    q = True
-    while q:
-        tml = None
+    st = stat(toml)
+    res = (st[6], st[8])
+    try:
+        st = stat(toml + ".jnl")
+        res += (st[6], st[8])
+    except OSError:  # No journal
+        res += (0, 0)
+    if CACHE_HASH:
+        res += (_checksum(toml),)
+    del st
+    return res
+
+
+_INVALID = object()  # Index marker for values that failed to decode
+
+
+def _indexline(table, ln, tml):
+    """
+    Add a prepared key line to a table index.
+
+    Returns the key, or None if the line holds no key.
+    """
+    if "=" not in tml or tml.startswith("#"):
+        return None
+    eq = tml.find("=")
+    key = tml[:eq]
+    while key.endswith(" "):
+        key = key[:-1]
+    if key not in table:  # First one wins
         try:
-            tml = _prepareline(buf[tm])
-        except IndexError:
-            q = False
-        if q and tml.startswith("[") and (tml == f"[{subtable}]"):
-            result = tm
-            q = False
-        del tml
-        tm += 1
-        if not q:
-            break
-    del buf, subtable, tm, q
-    return result
+            table[key] = [ln, _parsevalue(tml[eq + 1 :])]
+        except (TypeError, ValueError, IndexError):
+            table[key] = [ln, _INVALID]  # Raised on fetch
+    del eq
+    return key
 
 
-def _getkeys(buf, start=0):
+class _Document:
     """
-    Get the keys off a table.
+    A parsed toml file.
+
+    Every line is prepared and decoded once, into an index of
+    table name -> key -> [line number, value].
+    The root table is stored under None.
     """
-    res = []
-    q = True
-    tm = start
-    while q:
-        tml = None
+
+    def __init__(self, data=None) -> None:
+        self.lines = data
+        self.changed = False  # Set by put / delete
+        self.tables = {}  # table name -> header line number
+        self.index = {None: {}}
+        if data is None:  # Filled in by the caller
+            return
+        table = self.index[None]
+        for ln in range(len(data)):
+            tml = _prepareline(data[ln])
+            if tml.startswith("[") and tml.endswith("]"):
+                name = tml[1:-1]
+                if name in self.tables:  # Only the first declaration counts
+                    table = None
+                else:
+                    self.tables[name] = ln
+                    table = {}
+                    self.index[name] = table
+                del name
+            elif table is not None:
+                _indexline(table, ln, tml)
+            del tml
+        del table
+
+    def get(self, item, subtable=None):
+        """
+        Value of a key, None if it does not exist.
+        """
+        entry = self.index.get(subtable, {}).get(item)
+        if entry is None:
+            return None
+        if entry[1] is _INVALID:
+            raise TypeError("Invalid value.")
+        return entry[1]
+
+    def keys(self, subtable=None) -> list:
+        """
+        Keys of a table, in file order.
+        """
+        table = self.index.get(subtable, {})
+        return sorted(table, key=lambda k: table[k][0])
+
+    def table(self, subtable=None) -> dict:
+        """
+        All the values of a table.
+        """
+        res = {}
+        for key in self.keys(subtable):
+            res[key] = self.get(key, subtable)
+        return res
+
+    def _shift(self, start, by) -> None:
+        """
+        Move every line number at or after start.
+        """
+        for table in self.index.values():
+            for entry in table.values():
+                if entry[0] >= start:
+                    entry[0] += by
+        for name in self.tables:
+            if self.tables[name] >= start:
+                self.tables[name] += by
+
+    def put(self, item, value, subtable=None, comment=None) -> None:
+        """
+        Store / Update a value in the loaded lines.
+        """
+        self._putline(item, value, subtable, _linemake(item, value, comment))
+
+    def _putline(self, item, value, subtable, line) -> None:
+        """
+        Store an already made line.
+        Without loaded lines only the index is updated.
+        """
+        self.changed = True
+        table = self.index.get(subtable)
+        if self.lines is None:
+            if table is None:
+                table = {}
+                self.index[subtable] = table
+            if item in table:
+                table[item][1] = value
+            else:  # Sorts first, like a new key at the top of the table
+                table[item] = [-1, value]
+        elif table is None:  # Need to create new subtable
+            self.lines.append(f"[{subtable}]")
+            self.tables[subtable] = len(self.lines) - 1
+            table = {}
+            self.index[subtable] = table
+            self.lines.append(line)
+            table[item] = [len(self.lines) - 1, value]
+        elif item in table:  # Existing key
+            table[item][1] = value
+            self.lines[table[item][0]] = line
+        else:  # New key, at the top of the table
+            ln = 0 if subtable is None else self.tables[subtable] + 1
+            self._shift(ln, 1)
+            self.lines.insert(ln, line)
+            table[item] = [ln, value]
+            del ln
+        del line, table
+
+    def delete(self, item, subtable=None) -> None:
+        """
+        Remove a key from the loaded lines.
+        """
+        entry = self.index.get(subtable, {}).pop(item, None)
+        if entry is not None:
+            self.changed = True
+            if self.lines is not None:
+                self.lines.pop(entry[0])
+                self._shift(entry[0], -1)
+        del entry
+
+
+def _recover(toml) -> bool:
+    """
+    Finish a write that was cut between removing the old file and the rename.
+    """
+    try:
+        rename(toml + ".tmp", toml)
+    except OSError:
+        return False
+    return True
+
+
+def _replay(toml, doc) -> None:
+    """
+    Apply the journal records of a toml file on top of a document.
+
+    A record is a newline, "+" (put) or "-" (delete), the table name
+    (empty for root), a tab, the toml line or key and a closing tab.
+    A record cut short by a power loss has no closing tab and is skipped.
+    """
+    try:
+        jnl = open(toml + ".jnl")
+    except OSError:  # No journal
+        return
+    with jnl:
+        while True:
+            rec = jnl.readline()
+            if not rec:
+                break
+            while rec.endswith("\n"):
+                rec = rec[:-1]
+            tab = rec.find("\t")
+            if len(rec) < 3 or tab == -1 or not rec.endswith("\t"):
+                continue
+            subtable = rec[1:tab] or None
+            line = rec[tab + 1 : -1]
+            if rec[0] == "+" and "=" in line:
+                key = _prepareline(line[: line.find("=")])
+                try:
+                    value = _linevalue(line)
+                except (TypeError, ValueError, IndexError):
+                    value = _INVALID
+                doc._putline(key, value, subtable, line)
+                del key, value
+            elif rec[0] == "-":
+                doc.delete(line, subtable)
+            del tab, subtable, line
+    del jnl
+
+
+def _journal(toml, op, subtable, payload, apply) -> None:
+    """
+    Append one record to the journal of a toml file.
+
+    The cached document is kept in step through apply,
+    and the journal is compacted once it grows past JOURNAL_MAX.
+    """
+    try:
+        st = _stamp(toml)
+    except OSError:
+        raise OSError("Toml file not found")
+    with open(toml + ".jnl", "a") as jnl:
+        jnl.write(f"\n{op}{subtable or ''}\t{payload}\t")
+    hit = _cache.get(toml)
+    if hit is not None:
+        if hit[0] == st:  # Was up to date before the append
+            apply(hit[1])
+            _cache[toml] = (_stamp(toml), hit[1])
+        else:
+            _cache.pop(toml, None)
+    del hit, st
+    if stat(toml + ".jnl")[6] > JOURNAL_MAX:
+        compact(toml)
+
+
+def _open(toml):
+    """
+    Open a toml file for reading.
+    """
+    try:
+        return open(toml)
+    except OSError:
+        if not _recover(toml):
+            raise OSError("Toml file not found")
+    return open(toml)
+
+
+def _parse(toml) -> _Document:
+    """
+    Read and index a toml file from disk, without its journal.
+    """
+    with _open(toml) as tomlf:
+        return _Document(_dataformat(tomlf.read()))
+
+
+def _read(toml) -> _Document:
+    """
+    Read and index a toml file from disk, journal included.
+    """
+    doc = _parse(toml)
+    _replay(toml, doc)
+    doc.changed = False  # The journal alone is not worth a write
+    return doc
+
+
+def _stream(toml, subtable=None, item=None) -> _Document:
+    """
+    Index a single table of a toml file, reading it line by line.
+
+    Stops at the end of the table, or as soon as item is found,
+    so peak memory is a line plus that table whatever the file size.
+    The journal is applied on top.
+    """
+    doc = _Document()
+    table = {}
+    doc.index[subtable] = table
+    active = subtable is None  # Root keys come before any table
+    ln = 0
+    with _open(toml) as tomlf:
+        while True:
+            tml = tomlf.readline()
+            if not tml:
+                break
+            tml = _prepareline(tml)
+            if tml.startswith("[") and tml.endswith("]"):
+                if active:  # End of the table
+                    break
+                active = tml[1:-1] == subtable
+            elif active and _indexline(table, ln, tml) == item and item is not None:
+                break
+            ln += 1
+    del table, active, ln, tml
+    _replay(toml, doc)
+    return doc
+
+
+def _write(toml, data) -> None:
+    """
+    Format and write the lines back to disk.
+
+    The data goes to a temporary file first which then replaces the toml,
+    so a power loss never leaves a half written file behind.
+    """
+    data = _applyformatting(data)
+    tmp = toml + ".tmp"
+    with open(tmp, "w") as tomlw:
+        for line in data:
+            tomlw.write(f"{line}\n")
+            del line
+    try:
+        rename(tmp, toml)
+    except OSError:  # FAT will not rename over an existing file
+        remove(toml)
+        rename(tmp, toml)
+    for old in (".jnl", ".bin"):  # Journal folded in, snapshot outdated
         try:
-            tml = _prepareline(buf[tm])
-        except IndexError:
-            q = False
-        if q and "=" in tml and not tml.startswith("["):
-            tml = tml[: tml.find("=")]
-            while tml.endswith(" "):
-                tml = tml[:-1]
-            res.append(tml)
-        elif q and tml.startswith("["):
-            q = False
-        del tml
-        tm += 1
-    del buf, start, tm, q
-    return res
+            remove(toml + old)
+        except OSError:
+            pass
+    invalidate(toml)
+    del data, tmp
 
 
-def keys(subtable=None, toml="/settings.toml"):
+class _Edit:
+    """
+    Context manager behind edit().
+    """
+
+    def __init__(self, toml) -> None:
+        self._toml = toml
+        self._doc = None
+
+    def __enter__(self) -> _Document:
+        self._doc = _read(self._toml)
+        return self._doc
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_type is None and self._doc.changed:
+            _write(self._toml, self._doc.lines)
+        self._doc = None
+        return False
+
+
+def edit(toml="/settings.toml") -> _Edit:
+    """
+    Batch several changes into a single write of the toml file.
+
+        with edit() as doc:
+            doc.put("ssid", "password", "IWD")
+            doc.delete("old_ssid", "IWD")
+
+    Reads inside the block see the pending changes.
+    Nothing is written if the block raises.
+    """
+    return _Edit(toml)
+
+
+def _snapsave(toml, doc, st) -> None:
+    """
+    Write the index of a freshly parsed document as a binary snapshot.
+
+    Layout, little endian:
+    header  "CPTS", version B, source size I, mtime I, crc I
+    table   "[", name length B, name
+    key     type tag, key length B, line H, key, then per tag
+            s: length H + utf-8, i: int32, l: length H + digits,
+            t / f / n: nothing, x: value failed to decode
+    trailer record count I, "CPTS"
+    Keys before the first table record belong to the root table.
+    Written to a temporary file then renamed, like the toml itself.
+    Documents with a name, line number or value too long for the
+    fields get no snapshot.
+    """
+    crc = st[4] if CACHE_HASH else _checksum(toml)
+    tmp = toml + ".bin.tmp"
+    try:
+        with open(tmp, "wb") as snap:
+            snap.write(_SNAP_MAGIC + pack("<BIII", _SNAP_VERSION, st[0], st[1], crc))
+            records = 0
+            for name in doc.index:
+                table = doc.index[name]
+                if name is not None:
+                    name = name.encode()
+                    if len(name) > 255:
+                        raise ValueError("Table name too long")
+                    snap.write(b"[" + pack("<B", len(name)) + name)
+                    records += 1
+                for key in table:
+                    ln, value = table[key]
+                    key = key.encode()
+                    if value is _INVALID:
+                        tag, data = b"x", b""
+                    elif value is None:
+                        tag, data = b"n", b""
+                    elif value is True:
+                        tag, data = b"t", b""
+                    elif value is False:
+                        tag, data = b"f", b""
+                    elif isinstance(value, int) and -(2**31) <= value < 2**31:
+                        tag, data = b"i", pack("<i", value)
+                    else:
+                        tag = b"l" if isinstance(value, int) else b"s"
+                        data = (str(value) if tag == b"l" else value).encode()
+                        if len(data) > 65535:
+                            raise ValueError("Value too long")
+                        data = pack("<H", len(data)) + data
+                    if len(key) > 255 or not 0 <= ln <= 65535:
+                        raise ValueError("Key too long")
+                    snap.write(tag + pack("<BH", len(key), ln) + key + data)
+                    records += 1
+                    del ln, value, key, tag, data
+                del table
+            snap.write(pack("<I", records) + _SNAP_MAGIC)
+        try:
+            rename(tmp, toml + ".bin")
+        except OSError:  # FAT will not rename over an existing file
+            remove(toml + ".bin")
+            rename(tmp, toml + ".bin")
+    except (OSError, ValueError):  # Read only or unfit, the snapshot is only an optimization
+        try:
+            remove(tmp)
+        except OSError:
+            pass
+    del crc, tmp
+
+
+def _snapload(toml, st):
+    """
+    Load the binary snapshot of a toml file.
+
+    Returns None when there is none, or it does not match the file anymore.
+    Size and mtime alone miss same size edits within a second, and boards
+    without a clock, so the crc of the file is always compared as well.
+    """
     try:
-        with open(toml) as tomlf:
-            data = _dataformat(tomlf.read())  # load into list
-            result = []
-            if subtable is None:  # Browse root table
-                result += _getkeys(data)  # fetch keys
+        with open(toml + ".bin", "rb") as snap:
+            data = snap.read()
+    except OSError:
+        return None
+    if len(data) < 25 or data[:4] != _SNAP_MAGIC or data[-4:] != _SNAP_MAGIC:
+        return None
+    version, size, mtime, crc = unpack_from("<BIII", data, 4)
+    if version != _SNAP_VERSION or size != st[0] or mtime != st[1]:
+        return None
+    if crc != (st[4] if CACHE_HASH else _checksum(toml)):
+        return None
+    doc = _Document()
+    table = doc.index[None]
+    ps = 17
+    last = len(data) - 8  # Trailer
+    records = 0
+    try:
+        while ps < last:
+            records += 1
+            tag = data[ps]
+            if tag == 0x5B:  # "["
+                end = ps + 2 + data[ps + 1]
+                table = {}
+                doc.index[data[ps + 2 : end].decode()] = table
+                ps = end
+                continue
+            klen, ln = unpack_from("<BH", data, ps + 1)
+            ps += 4
+            key = data[ps : ps + klen].decode()
+            ps += klen
+            if tag == 0x73:  # "s"
+                end = ps + 2 + unpack_from("<H", data, ps)[0]
+                value = data[ps + 2 : end].decode()
+                ps = end
+            elif tag == 0x69:  # "i"
+                value = unpack_from("<i", data, ps)[0]
+                ps += 4
+            elif tag == 0x6C:  # "l"
+                end = ps + 2 + unpack_from("<H", data, ps)[0]
+                value = int(data[ps + 2 : end].decode())
+                ps = end
+            elif tag == 0x74:  # "t"
+                value = True
+            elif tag == 0x66:  # "f"
+                value = False
+            elif tag == 0x6E:  # "n"
+                value = None
+            elif tag == 0x78:  # "x"
+                value = _INVALID
             else:
-                start = _tablefind(data, subtable)  # find table offset
-                if start != -1:  # table found
-                    result += _getkeys(data, start + 1)  # fetch keys
-                del start
-            del data, subtable, toml
-            result2 = []
-            for i in result:
-                if i[0] != "#":
-                    result2.append(i)
-            del result
-            return result2
+                return None
+            table[key] = [ln, value]
+    except Exception:  # Truncated or damaged
+        return None
+    if ps != last or records != unpack_from("<I", data, last)[0]:
+        return None
+    del data
+    return doc
+
+
+def _load(toml, subtable=None, item=None) -> _Document:
+    """
+    Get the index of a toml file for reading.
+
+    Served from the cache while the file stamp is unchanged,
+    then from the binary snapshot when SNAPSHOT is set.
+    The lines are dropped, the document is shared and read only.
+    Files the cache cannot hold are streamed instead, in which case
+    only subtable (up to item, if given) is indexed.
+    """
+    if not CACHE_MAX:
+        return _stream(toml, subtable, item)
+    try:
+        st = _stamp(toml)
     except OSError:
-        del item, subtable, toml
-        raise OSError("Toml file not found")
+        if not _recover(toml):
+            raise OSError("Toml file not found")
+        st = _stamp(toml)
+    hit = _cache.get(toml)
+    if hit is not None and hit[0] == st:
+        return hit[1]
+    del hit
+    if st[0] > CACHE_MAX:  # Too big for the cap
+        _cache.pop(toml, None)
+        return _stream(toml, subtable, item)
+    doc = None
+    if SNAPSHOT:
+        doc = _snapload(toml, st)
+    if doc is None:
+        doc = _parse(toml)
+        doc.lines = None
+        if SNAPSHOT:
+            _snapsave(toml, doc, st)
+    _replay(toml, doc)
+    doc.changed = False
+    _cache[toml] = (st, doc)
+    del st
+    return doc
+
+
+def invalidate(toml=None) -> None:
+    """
+    Drop the cached copy of a toml file.
+    With no file given, the whole cache is cleared.
+    """
+    if toml is None:
+        _cache.clear()
+    else:
+        _cache.pop(toml, None)
+
+
+def keys(subtable=None, toml="/settings.toml"):
+    return _load(toml, subtable).keys(subtable)
 
 
 def fetch(item, subtable=None, toml="/settings.toml"):
@@ -237,29 +733,45 @@ def fetch(item, subtable=None, toml="/settings.toml"):
     if subtable is not None and not isinstance(subtable, str):
         del item, subtable, toml
         raise TypeError("Subtable should be str.")
-    try:
-        with open(toml) as tomlf:
-            data = _dataformat(tomlf.read())  # load into list
-            result = None
-            if subtable is None:  # Browse root table
-                target = _linefind(data, item)
-                if target != -1:
-                    result = _linevalue(data[target])
-            else:
-                start = _tablefind(data, subtable)  # find table offset
-                if start != -1:
-                    start += 1
-                if start != -1:  # table found
-                    tr = _linefind(data, item, start)  # fetch item index
-                    if tr != -1:
-                        result = _linevalue(data[tr])  # load value
-                    del tr
-                del start
-            del data, subtable, toml, item
-            return result
-    except OSError:
-        del item, subtable, toml
-        raise OSError("Toml file not found")
+    return _load(toml, subtable, item).get(item, subtable)
+
+
+def table(subtable=None, toml="/settings.toml") -> dict:
+    """
+    Fetch a whole table as a dict, with a single read of the file.
+    """
+    if subtable is not None and not isinstance(subtable, str):
+        del subtable, toml
+        raise TypeError("Subtable should be str.")
+    return _load(toml, subtable).table(subtable)
+
+
+def fetch_many(items, subtable=None, toml="/settings.toml") -> list:
+    """
+    Fetch several values of a table at once, in the order given.
+    Missing items are None.
+    """
+    if subtable is not None and not isinstance(subtable, str):
+        del items, subtable, toml
+        raise TypeError("Subtable should be str.")
+    doc = _load(toml, subtable)
+    res = []
+    for item in items:
+        if not isinstance(item, str):
+            del items, subtable, toml, doc, res
+            raise TypeError("Item should be str.")
+        res.append(doc.get(item, subtable))
+    del items, subtable, toml, doc
+    return res
+
+
+def compact(toml="/settings.toml") -> None:
+    """
+    Fold the journal back into the toml file.
+    """
+    doc = _read(toml)
+    _write(toml, doc.lines)
+    del doc
 
 
 def put(item, value, subtable=None, toml="/settings.toml", comment=None) -> None:
@@ -267,71 +779,34 @@ def put(item, value, subtable=None, toml="/settings.toml", comment=None) -> None
     Store / Update a value. You can also place a comment.
 
     The existing comment will be removed.
+    With JOURNAL set the change is appended to the journal instead.
     """
-    data = None
-    ro = False
-
-    try:
-        with open(toml) as tomlr:
-            data = _dataformat(tomlr.read())
-    except OSError:
-        raise OSError("Toml file not found")
-    if data is not None:
-        # Find target line
-        start = 0
-        if subtable is not None:
-            start = _tablefind(data, subtable)  # find table offset
-        if start == -1:  # Need to create new subtable
-            data.append(f"[{subtable}]")
-            data.append(_linemake(item, value, comment))
-        else:  # Whatever start says
-            if start:
-                start += 1
-            tr = _linefind(data, item, start)  # fetch item index
-            if tr == -1:  # New key
-                data.insert(start, _linemake(item, value, comment))
-            else:  # Existing key
-                data[tr] = _linemake(item, value, comment)
-        del start
-
-        # Reapply formatting
-        data = _applyformatting(data)
-
-        # Write to file
-        with open(toml, "w") as tomlw:
-            for line in data:
-                tomlw.write(f"{line}\n")
-                del line
-    del item, value, subtable, toml, comment, data, ro
+    if JOURNAL:
+        line = _linemake(item, value, comment)
+        _journal(
+            toml,
+            "+",
+            subtable,
+            line,
+            lambda doc: doc._putline(item, value, subtable, line),
+        )
+        del line
+    else:
+        with edit(toml) as doc:
+            doc.put(item, value, subtable, comment)
+        del doc
+    del item, value, subtable, toml, comment
 
 
 def delete(item, subtable=None, toml="/settings.toml") -> None:
     """
     Delete an entry on the toml file.
+    With JOURNAL set the change is appended to the journal instead.
     """
-    data = None
-    try:
-        with open(toml) as tomlr:
-            data = _dataformat(tomlr.read())
-    except OSError:
-        raise OSError("Toml file not found")
-    if data is not None:
-        # Find target line
-        start = 0
-        if subtable is not None:
-            start = _tablefind(data, subtable)  # find table offset
-        if start != -1:
-            tr = _linefind(data, item, start + 1)  # fetch item index
-            if tr != -1:
-                data.pop(tr)
-        del start
-
-        # Reapply formatting
-        data = _applyformatting(data)
-
-        # Write to file
-        with open(toml, "w") as tomlw:
-            for line in data:
-                tomlw.write(f"{line}\n")
-                del line
-    del item, subtable, toml, data
+    if JOURNAL:
+        _journal(toml, "-", subtable, item, lambda doc: doc.delete(item, subtable))
+    else:
+        with edit(toml) as doc:
+            doc.delete(item, subtable)
+        del doc
+    del item, subtable, toml
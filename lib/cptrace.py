@@ -0,0 +1,122 @@
+from struct import pack_into, unpack_from
+from time import monotonic_ns
+
+# Levels
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+RECORDS = 64  # Records kept before the oldest are overwritten
+
+# Record: timestamp ms (wraps), event id, pad, two integers
+_FMT = "<IBxii"
+_SIZE = 14
+
+_buf = bytearray(RECORDS * _SIZE)
+_head = 0  # Oldest record
+_count = 0  # Records stored
+_dropped = 0  # Records overwritten before being drained
+
+_events = []  # event id -> (fmt, level, categories)
+_enabled = bytearray(256)  # event id -> passes the filter
+_level = INFO
+_categories = 0xFF
+
+
+def _filter(ev) -> int:
+    fmt, level, cat = _events[ev]
+    return 1 if level >= _level and cat & _categories else 0
+
+
+def event(fmt, level=DEBUG, category=1) -> int:
+    """
+    Register an event, returns its id for log().
+    fmt is a str formatted with the two integers, or a function of them.
+    Only called at import, the text is never built unless drained.
+    """
+    if len(_events) == len(_enabled):
+        raise ValueError("Too many events")
+    _events.append((fmt, level, category))
+    ev = len(_events) - 1
+    _enabled[ev] = _filter(ev)
+    return ev
+
+
+def configure(level=None, categories=None, records=None) -> None:
+    """
+    Set the level and category bitmask filters, and resize the buffer.
+    Resizing drops whatever was stored.
+    """
+    global _level, _categories, _buf, _head, _count
+    if level is not None:
+        _level = level
+    if categories is not None:
+        _categories = categories
+    for ev in range(len(_events)):
+        _enabled[ev] = _filter(ev)
+    if records is not None and records * _SIZE != len(_buf):
+        _buf = bytearray(records * _SIZE)
+        _head = _count = 0
+
+
+def enabled(ev) -> bool:
+    return bool(_enabled[ev])
+
+
+def log(ev, a=0, b=0) -> None:
+    """
+    Store a record, cheap enough for the hot loops.
+    Overwrites the oldest record when full.
+    """
+    global _head, _count, _dropped
+    if not _enabled[ev]:
+        return
+    slots = len(_buf) // _SIZE
+    if _count == slots:
+        _head = (_head + 1) % slots
+        _count -= 1
+        _dropped += 1
+    pack_into(
+        _FMT,
+        _buf,
+        ((_head + _count) % slots) * _SIZE,
+        (monotonic_ns() // 1000000) & 0xFFFFFFFF,
+        ev,
+        a,
+        b,
+    )
+    _count += 1
+
+
+def pending() -> int:
+    return _count
+
+
+def clear() -> None:
+    global _head, _count, _dropped
+    _head = _count = _dropped = 0
+
+
+def drain(write, limit=8) -> int:
+    """
+    Format up to limit records as text and hand each line to write,
+    which can be a USB or telnet writer. Call when idle.
+    Returns the records drained.
+    """
+    global _head, _count, _dropped
+    if _dropped:
+        write("[trace] " + str(_dropped) + " records dropped\n\r")
+        _dropped = 0
+    slots = len(_buf) // _SIZE
+    done = 0
+    while _count and done < limit:
+        ms, ev, a, b = unpack_from(_FMT, _buf, _head * _SIZE)
+        _head = (_head + 1) % slots
+        _count -= 1
+        fmt = _events[ev][0]
+        text = fmt.format(a, b) if isinstance(fmt, str) else fmt(a, b)
+        write("[" + str(ms // 1000) + "." + ("00" + str(ms % 1000))[-3:] + "] " + text + "\n\r")
+        del text
+        done += 1
+    return done
@@ -1,3 +1,5 @@
+from time import monotonic_ns
+
 IAC = 255  # Interpret as Command
 DO = 253  # Do option
 DONT = 254  # Dont option
@@ -6,223 +8,621 @@ WONT = 252  # Wont option
 TT = 24  # Terminal Type
 ECHO = 1  # Local echo
 EON = 254  # End of negotiations
+SB = 250  # Subnegotiation begin
+SE = 240  # Subnegotiation end
+LINEMODE = 34  # RFC 1184 line mode
+LM_MODE = 1  # LINEMODE MODE subnegotiation
+MODE_EDIT = 1  # Client edits the line locally
+MODE_ACK = 4  # Mode acknowledgement bit
+
+NEGOTIATION_TIMEOUT = 10  # Seconds a new client gets to finish negotiating
+
+# Telnet command parser states of a session
+_DATA = 0  # Plain data
+_CMD = 1  # Got IAC
+_OPT = 2  # Got IAC and a verb, waiting for the option
+_SUB = 3  # Inside a subnegotiation
+_SUB_IAC = 4  # Got IAC inside a subnegotiation
+
+_WRAP = 0x3FFFFFFF  # Stream offsets wrap here, staying small ints
+
+# What write() does when the output queue of a session is full
+OVERFLOW_DROP = 0  # Drop what does not fit
+OVERFLOW_OLDEST = 1  # Drop the oldest queued bytes to make room
+OVERFLOW_BLOCK = 2  # Wait for the client to take more (backpressure)
+
+
+class _ring:
+    """
+    Fixed size circular byte buffer, allocated once.
+    """
+
+    def __init__(self, size) -> None:
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.head = 0  # Read position
+        self.count = 0  # Bytes stored
+        self.taken = 0  # Bytes ever consumed, wraps at _WRAP
+
+    def __len__(self) -> int:
+        return self.count
+
+    def room(self) -> int:
+        return len(self.buf) - self.count
+
+    def span(self):
+        """
+        The contiguous free space after the stored data, for recv_into.
+        """
+        tail = (self.head + self.count) % len(self.buf)
+        if self.count == len(self.buf):
+            return self.mv[tail:tail]
+        if tail >= self.head:
+            return self.mv[tail:]
+        return self.mv[tail : self.head]
+
+    def commit(self, size) -> None:
+        """
+        Mark size bytes of the last span as stored.
+        """
+        self.count += size
+
+    def data(self):
+        """
+        The contiguous stored bytes at the head, for send.
+        """
+        return self.mv[self.head : self.head + min(self.count, len(self.buf) - self.head)]
+
+    def consume(self, size) -> None:
+        """
+        Drop size bytes from the head.
+        """
+        self.head = (self.head + size) % len(self.buf)
+        self.count -= size
+        self.taken = (self.taken + size) & _WRAP
+        if not self.count:  # Keep spans as large as possible
+            self.head = 0
+
+    def write(self, data) -> int:
+        """
+        Store as much of data as fits, returns the amount stored.
+        """
+        data = memoryview(data)
+        size = 0
+        while size < len(data):
+            span = self.span()
+            part = min(len(span), len(data) - size)
+            if not part:  # Full
+                break
+            span[:part] = data[size : size + part]
+            self.commit(part)
+            size += part
+            del span, part
+        del data
+        return size
+
+    def offset(self, pos) -> int:
+        """
+        Where the byte at stream offset pos is stored, counted from the head.
+        Below len() while it is stored.
+        """
+        return (pos - self.taken) & _WRAP
+
+    def readinto(self, buf) -> int:
+        """
+        Move stored bytes into buf, returns the amount moved.
+        """
+        size = min(len(buf), self.count)
+        first = min(size, len(self.buf) - self.head)
+        buf[:first] = self.mv[self.head : self.head + first]
+        if size > first:  # Wrapped around
+            buf[first:size] = self.mv[: size - first]
+        self.consume(size)
+        return size
+
+    def clear(self) -> None:
+        self.taken = (self.taken + self.count) & _WRAP
+        self.head = 0
+        self.count = 0
+
+
+class _session:
+    """
+    One connected telnet client, with its own buffers.
+    """
+
+    def __init__(self, conn, client, rxsize, txsize) -> None:
+        self.conn = conn
+        self.client = client  # IP and port of the client
+        self.rx = _ring(rxsize)  # Received data
+        self.tx = _ring(txsize)  # Output queue
+        self.negotiated = False
+        self.deadline = monotonic_ns() + NEGOTIATION_TIMEOUT * 1000000000
+        self.state = _DATA  # Telnet command parser state
+        self.verb = 0  # Verb of the command being parsed
+        self.sub = bytearray(4)  # Start of the subnegotiation being parsed
+        self.sublen = 0
+        self.linemode = False  # Client sends whole lines
+        self.eol = []  # Stream offsets of the line feeds in rx, noted while feeding
+        self.alive = True  # Cleared when dropped
 
 
 class telnet_console:  # The actual class you need to use
-    def __init__(self, socket, ip, maxbuf=64, backlog=2, timeout=0) -> None:
+    def __init__(
+        self,
+        socket,
+        ip,
+        maxbuf=64,
+        backlog=2,
+        timeout=0,
+        rxsize=256,
+        txsize=512,
+        overflow=OVERFLOW_DROP,
+        accept_interval=0.5,
+        linemode=True,
+    ) -> None:
         """
         Socket object
         IP to bind to (str)
         max buffer length
-        backlog of connections
-        timeout is the time to wait for possible connections & recv
+        backlog of connections, also the max concurrent sessions
+        timeout is the time to wait for recv
+        rxsize is the input buffer length of each session
+        txsize is the output queue length of each session
+        overflow is what write() does with a full queue, see OVERFLOW_*
+        accept_interval is how often (seconds) the accessors look for
+        new clients, None to only do so in poll()
+        linemode asks clients to edit lines locally and send them whole
         """
 
         # Private
         self._in_buf = str()  # stored internally as str
         self._socket = socket
-        self._socket.settimeout(timeout)
+        self._socket.settimeout(0)
         """
-        0 for non-blocking
-        We do need the connection attempts to be blocking
+        Accepting never blocks, new clients are picked up
+        whenever the console is used.
         """
         self._socket.bind((ip, 23))  # Telnet port
         self._socket.listen(backlog)
-        self._conn = None  # Connection storage
-        self._client = None  # IP of client
+        self._sessions = []  # Connected clients
+        self._ready = []  # Sessions done negotiating, the ones used for I/O
+        self._connected = False  # Cached, kept in step with _ready
+        self._accept_ns = None if accept_interval is None else int(accept_interval * 1e9)
+        self._next_accept = 0  # monotonic_ns of the next accept attempt
         self._rx_buf = bytearray(maxbuf)  # Receive buffer, static allocation
-        self._ps_buf = bytearray()  # Parse buffer
-        self._tx_buf = bytearray()  # Send buffer
+        self._cmd_buf = bytearray((IAC, 0, 0))  # Negotiation command
+        self._iac_buf = bytearray((IAC,))  # Escaped 255 data byte
         self._timeout = timeout
         self._maxbuf = maxbuf
+        self._backlog = backlog
+        self._rxsize = rxsize
+        self._txsize = txsize
+        self._overflow = overflow
+        self._linemode = linemode
+        self._lm_buf = bytes((IAC, SB, LINEMODE, LM_MODE, MODE_EDIT, IAC, SE))
 
     def _connect(self) -> None:
-        failc = 0
-        if self._conn is None:
+        """
+        Accept any waiting clients, up to backlog sessions.
+        Negotiation happens later, a few bytes at a time in _rr().
+        """
+        while len(self._sessions) < self._backlog:
             try:
-                self._conn, self._client = self._socket.accept()
-                self._conn.settimeout(10)
-                self._conn.setblocking(True)
-                """
-                Do not make the connection nonblocking now
-                since the negotiation may take time.
-                """
-                cont = True
-
-                while cont:
-                    ps = 0
-                    size = self._conn.recv_into(self._rx_buf, self._maxbuf)
-                    while ps < size:
-                        mb = self._rx_buf[ps]
-                        ps += 1
-                        if mb == IAC:
-                            mb = self._rx_buf[ps]
-                            ps += 1
-                            if mb == WILL:
-                                mb = self._rx_buf[ps]
-                                ps += 1
-                                if mb == TT:  # Mandatory
-                                    self._tx_buf.append(IAC)
-                                    self._tx_buf.append(WILL)
-                                    self._tx_buf.append(TT)
-                                else:
-                                    self._tx_buf.append(IAC)
-                                    self._tx_buf.append(DONT)
-                                    self._tx_buf.append(mb)
-                            elif mb == DO:
-                                mb = self._rx_buf[ps]
-                                ps += 1
-                                if mb == ECHO:  # We accept
-                                    self._tx_buf.append(IAC)
-                                    self._tx_buf.append(DO)
-                                    self._tx_buf.append(ECHO)
-                                else:
-                                    self._tx_buf.append(IAC)
-                                    self._tx_buf.append(DONT)
-                                    self._tx_buf.append(mb)
-                            elif mb == EON:
-                                """
-                                Negotiations from client done.
-                                Proceed to disable echo.
-                                """
-                                self._tx_buf.append(IAC)
-                                self._tx_buf.append(WILL)
-                                self._tx_buf.append(ECHO)
-                                ps += 1
-                            elif mb == WONT:  # Client said WONT ECHO.
-                                ps += 1
-                                cont = False  # We are finally done.
-                            else:
-                                self.disconnect()
-                                raise ConnectionError("Negotiation failed")
-                        else:  # Negotiation failed
-                            self.disconnect()
-                            raise ConnectionError("Negotiation failed")
-                        self._rt()  # Transmit
-                    del size, ps
-                del cont
-            except OSError:  # No connection took place.
-                self.disconnect()
-
-            if self._conn is not None:
-                """
-                Now make the connection non-blocking
-                since we need to fetch text asyncronously.
-                """
-                self._conn.settimeout(0)
-                self._conn.setblocking(False)
-
-    def _rt(self) -> None:
+                conn, client = self._socket.accept()
+            except OSError:  # No connection waiting.
+                break
+            conn.settimeout(0)
+            conn.setblocking(False)
+            sess = _session(conn, client, self._rxsize, self._txsize)
+            self._sessions.append(sess)
+            if self._linemode:
+                self._reply(sess, DO, LINEMODE)
+                self._rt(sess)
+            del conn, client, sess
+
+    def _feed(self, sess, size) -> None:
+        """
+        Run received bytes through the session's telnet parser.
+
+        Any IAC sequence, even one split across reads, is taken out,
+        the remaining data goes to the input buffer.
+        """
+        buf = self._rx_buf
+        mv = memoryview(buf)
+        start = 0  # Start of the current run of data bytes
+        for ps in range(size):
+            mb = buf[ps]
+            if sess.state == _DATA:
+                if mb != IAC:
+                    if mb == 10:  # "\n", note where it lands in rx
+                        sess.eol.append((sess.rx.taken + len(sess.rx) + ps - start) & _WRAP)
+                    continue
+                if ps > start:
+                    sess.rx.write(mv[start:ps])
+                sess.state = _CMD
+            elif sess.state == _CMD:
+                if mb == IAC:  # Escaped data byte
+                    sess.rx.write(self._iac_buf)
+                    sess.state = _DATA
+                elif mb in (WILL, WONT, DO, DONT):
+                    sess.verb = mb
+                    sess.state = _OPT
+                elif mb == SB:
+                    sess.state = _SUB
+                    sess.sublen = 0
+                else:  # Single byte command, nothing to do
+                    sess.state = _DATA
+            elif sess.state == _OPT:
+                sess.state = _DATA
+                self._option(sess, sess.verb, mb)
+            elif sess.state == _SUB:
+                if mb == IAC:
+                    sess.state = _SUB_IAC
+                else:
+                    self._subbyte(sess, mb)
+            elif sess.state == _SUB_IAC:
+                if mb == SE:
+                    sess.state = _DATA
+                    self._subneg(sess)
+                else:  # IAC IAC is a literal 255
+                    sess.state = _SUB
+                    self._subbyte(sess, mb)
+            start = ps + 1
+            if not sess.alive:
+                break
+        if sess.alive and sess.state == _DATA and size > start:
+            sess.rx.write(mv[start:size])
+        del buf, mv, start
+        self._rt(sess)  # Replies
+
+    def _subbyte(self, sess, mb) -> None:
+        """
+        Keep the first few bytes of a subnegotiation, the rest is not needed.
+        """
+        if sess.sublen < len(sess.sub):
+            sess.sub[sess.sublen] = mb
+            sess.sublen += 1
+
+    def _subneg(self, sess) -> None:
+        """
+        Handle a complete subnegotiation of the client.
+        Only the LINEMODE MODE answer matters, the rest is ignored.
+        """
+        if sess.sublen >= 3 and sess.sub[0] == LINEMODE and sess.sub[1] == LM_MODE:
+            sess.linemode = bool(sess.sub[2] & MODE_EDIT)
+
+    def _option(self, sess, verb, option) -> None:
+        """
+        Handle a negotiation command of the client.
+        Once negotiated the options are settled and any further ones ignored,
+        except LINEMODE, which the client may answer at any time.
+        """
+        if option == LINEMODE and verb in (WILL, WONT):
+            sess.linemode = verb == WILL and self._linemode
+            if sess.linemode:  # Local editing, the client sends whole lines
+                sess.tx.write(self._lm_buf)
+            return
+        if sess.negotiated:
+            return
+        if verb == WILL:
+            if option == TT:  # Mandatory
+                self._reply(sess, WILL, TT)
+            else:
+                self._reply(sess, DONT, option)
+        elif verb == DO:
+            if option == ECHO:  # We accept
+                self._reply(sess, DO, ECHO)
+            else:
+                self._reply(sess, DONT, option)
+        elif verb == EON:
+            """
+            Negotiations from client done.
+            Proceed to disable echo,
+            unless the client edits lines and so echoes them itself.
+            """
+            self._reply(sess, WONT if sess.linemode else WILL, ECHO)
+        elif verb == WONT:  # Client said WONT ECHO.
+            sess.negotiated = True  # We are finally done.
+            self._ready.append(sess)
+            self._connected = True
+
+    def _select(self, client=None) -> list:
+        """
+        The sessions an operation applies to,
+        all of them or only the one of the given client.
+        """
+        if client is None:
+            return self._ready
+        for sess in self._ready:
+            if sess.client == client:
+                return [sess]
+        return []
+
+    def _reply(self, sess, verb, option) -> None:
+        """
+        Queue a negotiation command.
+        """
+        self._cmd_buf[1] = verb
+        self._cmd_buf[2] = option
+        sess.tx.write(self._cmd_buf)
+
+    def _rt(self, sess) -> None:
         """
         The internal transmit function.
-        Clears the tx bytearray.
+        Sends as much of the session's queue as the socket takes,
+        one send per contiguous span, and never waits for it.
         """
-        sent = 0
-        while sent != len(self._tx_buf):  # Bulk
+        while len(sess.tx):
             try:
-                sent += self._conn.send(memoryview(self._tx_buf)[sent:])
-            except OSError:  # EAGAIN for some reason.
-                pass
+                sent = sess.conn.send(sess.tx.data())
             except BrokenPipeError:
-                self.disconnect()
+                self._drop(sess)
                 break
-        self._tx_buf = bytearray()
+            except OSError:  # EAGAIN, the rest goes out on the next flush.
+                break
+            if not sent:
+                break
+            sess.tx.consume(sent)
 
-    def disconnect(self) -> None:
+    def _drop(self, sess) -> None:
         """
-        Disconnect and clear the connection.
+        Close a single session.
         """
-        if self._conn is not None:
-            self._conn.close()
-            self._conn = None
-        self._reset_rx_buffer()
+        if sess.alive:
+            sess.alive = False
+            self._sessions.remove(sess)
+            if sess.negotiated:
+                self._ready.remove(sess)
+            self._connected = bool(self._ready)
+        sess.conn.close()
+
+    def disconnect(self, client=None) -> None:
+        """
+        Disconnect and clear the connections.
+        Only the one of client if given.
+        """
+        for sess in list(self._sessions if client is None else self._select(client)):
+            self._drop(sess)
 
     @property
     def connected(self) -> bool:
-        self._connect()
-        return self._conn is not None
+        """
+        Whether any client is attached. Cheap, the state is cached and
+        new clients are only looked for, and moved along negotiating,
+        every accept_interval.
+        """
+        if self._accept_ns is not None:
+            now = monotonic_ns()
+            if now >= self._next_accept:
+                self._next_accept = now + self._accept_ns
+                self._connect()
+                if len(self._ready) < len(self._sessions):
+                    self._negotiate()
+            del now
+        return self._connected
+
+    def _negotiate(self) -> None:
+        """
+        Move the sessions still negotiating along, so that a console that
+        is never polled still gets there, one step per accept_interval.
+        """
+        for sess in list(self._sessions):
+            if not sess.negotiated:
+                self._rt(sess)
+                if sess.alive:
+                    self._rr(sess)
 
     @property
     def client(self):
         """
-        Returns a tuple with the connected client's ip and port.
+        Returns a tuple with the first connected client's ip and port.
         If no connection, returns None.
         """
-        return self._client if self.connected else None
+        return self._ready[0].client if self.connected else None
 
-    def _rr(self, block=False) -> None:
+    @property
+    def clients(self) -> list:
+        """
+        Returns the ip and port tuples of all connected clients.
+        """
+        if not self.connected:
+            return []
+        return [sess.client for sess in self._ready]
+
+    def _rr(self, sess, block=False) -> None:
         """
         The internal receive function.
-        Leaves the data in the internal buffer _ps_buf.
+        Receives into the static buffer and feeds the telnet parser,
+        until no more data is waiting or the input buffer is full.
+        Sessions that do not finish negotiating in time are dropped.
         """
-        if self.connected:
-            if block:
-                self._conn.settimeout(10)
-                self._conn.setblocking(True)
-            try:
-                while self.connected:  # Will get interrupted by except
-                    size = self._conn.recv_into(self._rx_buf, self._maxbuf)
-                    if size:
-                        self._ps_buf += memoryview(self._rx_buf)[:size]
-                    del size
-            except OSError:
-                pass
-            except BrokenPipeError:
-                self.disconnect()
-            if block:
-                self._conn.settimeout(0)
-                self._conn.setblocking(False)
+        if block:
+            sess.conn.settimeout(10)  # Blocking, but bounded
+        try:
+            while sess.alive:  # Will get interrupted by except
+                room = min(self._maxbuf, sess.rx.room())
+                if not room:  # Full, leave the rest to TCP
+                    break
+                size = sess.conn.recv_into(self._rx_buf, room)
+                if size:
+                    self._feed(sess, size)
+                else:  # Closed by the client
+                    self._drop(sess)
+                if block:  # One chunk is enough
+                    break
+                del size, room
+        except BrokenPipeError:
+            self._drop(sess)
+        except OSError:
+            pass
+        if block and sess.alive:
+            sess.conn.settimeout(0)
+        if sess.alive and not sess.negotiated and monotonic_ns() > sess.deadline:
+            self._drop(sess)
 
     @property
     def in_waiting(self) -> int:
         """
-        Returns the len of bytes in the internal (incoming) buffer.
+        Returns the len of bytes in the internal (incoming) buffers,
+        of the sessions that can be read from.
         """
+        res = 0
         if self.connected:
-            self._rr()
-            return len(self._ps_buf)
-        else:
-            return 0
+            for sess in list(self._ready):
+                self._rr(sess)
+                res += len(sess.rx)
+        return res
 
     def out_waiting(self) -> int:
         """
-        Returns the len of bytes in the internal (outgoing) buffer.
+        Returns the len of bytes in the internal (outgoing) buffers.
         """
-        return len(self._tx_buf)
-
-    def _reset_rx_buffer(self) -> None:
-        for i in range(len(self._rx_buf)):
-            self._rx_buf[i] = 0
+        res = 0
+        for sess in self._sessions:
+            res += len(sess.tx)
+        return res
 
     def reset_input_buffer(self) -> None:
-        for i in range(len(self._rx_buf)):
-            self._rx_buf[i] = 0
+        for sess in self._sessions:
+            sess.rx.clear()
+            sess.eol.clear()
 
     def reset_output_buffer(self) -> None:
-        self._tx_buf = bytearray()
+        for sess in self._sessions:
+            sess.tx.clear()
 
-    def read(self, count=None):  # many types returned: Bytes, None.
-        if self.connected:
-            if count is not None:
-                while len(self._ps_buf) < count:
-                    self._rr()
-            else:
-                self._rr(block=count is None)
-                count = len(self._ps_buf)
-            res = bytes(memoryview(self._ps_buf)[:count])
-            self._ps_buf = self._ps_buf[count:]
-            return res
+    def _pick(self, client=None):
+        """
+        Receive on the selected sessions and return the first with data,
+        else the first selected one. None if there is no session.
+        """
+        sessions = self._select(client)
+        for sess in list(sessions):
+            self._rr(sess)
+        for sess in sessions:
+            if len(sess.rx):
+                return sess
+        return sessions[0] if sessions else None
+
+    def _take(self, sess, buf) -> int:
+        """
+        Move input of a session into buf, keeping its line count right.
+        """
+        size = sess.rx.readinto(buf)
+        while sess.eol and sess.rx.offset(sess.eol[0]) >= len(sess.rx):  # Taken
+            sess.eol.pop(0)
+        return size
+
+    def readinto(self, buf, client=None) -> int:
+        """
+        Copy waiting input into buf without allocating.
+        Returns the amount of bytes copied, does not block.
+        """
+        sess = self._pick(client) if self.connected else None
+        if sess is None:
+            return 0
+        return self._take(sess, buf)
+
+    def readline(self, client=None):  # many types returned: Bytes, None.
+        """
+        Read a complete line, "\n" included, from the given client
+        or the first session that has one.
+        Returns None until a whole line is waiting, or the input buffer
+        is full without one.
+        """
+        if not self.connected:
+            return None
+        sessions = self._select(client)
+        for sess in list(sessions):
+            self._rr(sess)
+        for sess in sessions:
+            if sess.eol or not sess.rx.room():
+                break
         else:
             return None
+        size = sess.rx.offset(sess.eol.pop(0)) + 1 if sess.eol else len(sess.rx)
+        res = bytearray(size)
+        sess.rx.readinto(res)
+        return bytes(res)
 
-    def write(self, data="") -> int:
+    def read(self, count=None, client=None):  # many types returned: Bytes, None.
+        """
+        Read from the given client, or from the first
+        session that has data waiting.
+        """
+        sess = self._pick(client) if self.connected else None
+        if sess is None:
+            return None
+        if count is None:
+            if not len(sess.rx):
+                self._rr(sess, block=True)
+            count = len(sess.rx)
+        res = bytearray(count)
+        mv = memoryview(res)
+        got = self._take(sess, res)
+        while got < count and sess.alive:
+            self._rr(sess)
+            got += self._take(sess, mv[got:])
+        del mv
+        return bytes(res[:got]) if got < count else bytes(res)
+
+    def write(self, data="", client=None) -> int:
+        """
+        Queue data for every session, or only for the given client.
+
+        Small writes pile up in the queue and go out together
+        on flush() / poll(), or once the queue is half full.
+        Never blocks unless the overflow policy is OVERFLOW_BLOCK.
+        """
         lent = len(data)
-        if hasattr(self, "_tx_buf"):
-            self._tx_buf += data
-            if self.connected:
-                self._rt()
+        if hasattr(self, "_sessions") and self.connected:
+            for sess in list(self._select(client)):
+                self._queue(sess, data)
+                if len(sess.tx) * 2 >= self._txsize:
+                    self._rt(sess)
         return lent
 
+    def _queue(self, sess, data) -> None:
+        """
+        Add data to a session's queue, applying the overflow policy.
+        """
+        done = sess.tx.write(data)
+        if done == len(data):
+            return
+        if self._overflow == OVERFLOW_OLDEST:
+            data = memoryview(data)[done:]
+            if len(data) > self._txsize:  # Only the end can fit
+                data = data[len(data) - self._txsize :]
+            sess.tx.consume(min(len(sess.tx), len(data)))
+            sess.tx.write(data)
+        elif self._overflow == OVERFLOW_BLOCK:
+            data = memoryview(data)
+            while done < len(data) and sess.alive:
+                self._rt(sess)
+                done += sess.tx.write(data[done:])
+        del data, done
+
+    def flush(self, client=None) -> None:
+        """
+        Send what the sockets will take of the queued output.
+        """
+        for sess in list(self._select(client)):
+            self._rt(sess)
+
+    def poll(self) -> None:
+        """
+        Service the console, call this from the main loop.
+        Accepts new clients, drains the output queues and receives input.
+        """
+        self._connect()
+        if self._accept_ns is not None:
+            self._next_accept = monotonic_ns() + self._accept_ns
+        for sess in list(self._sessions):
+            self._rt(sess)
+            if sess.alive:
+                self._rr(sess)
+
     def deinit(self) -> None:
         """
         Delete the internal stuff and close any connections.
@@ -230,12 +630,13 @@ class telnet_console:  # The actual class you need to use
         self.disconnect()
         del (
             self._in_buf,
-            self._conn,
-            self._client,
+            self._sessions,
+            self._ready,
             self._socket,
             self._timeout,
-            self._tx_buf,
         )
-        del self._rx_buf, self._ps_buf, self._maxbuf, self
+        del self._rx_buf, self._cmd_buf, self._iac_buf, self._maxbuf, self._backlog
+        del self._rxsize, self._txsize, self._overflow, self._linemode, self._lm_buf
+        del self._connected, self._accept_ns, self._next_accept, self
         from time import sleep
         sleep(1.4)
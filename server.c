@@ -4,12 +4,22 @@
 #include <unistd.h>
 #include <arpa/inet.h>
 #include <pthread.h>
+#include <signal.h>
 
 // Static definitions
 #define PORT 5080
 #define MAX_CLIENTS 128
 #define BUFFER_SIZE 128
 
+// Binary control packets, network byte order:
+// magic, opcode, target ipv4, left, right, sequence number
+#define PKT_MAGIC 0xA5
+#define PKT_SIZE 12
+#define PKT_KEEP -32768  // Speed that leaves the motor as is
+#define OP_STOP 0
+#define OP_MOVE 1
+#define OP_FORWARD 2
+
 // Auth states
 typedef enum {
     UNAUTHENTICATED,
@@ -24,6 +34,8 @@ typedef struct {
     char ip[INET_ADDRSTRLEN];
     ClientState state;
     int vote_value;
+    int binary;  // Takes binary control packets
+    int last_seq;  // Sequence number of its last relayed packet, -1 before the first
 } Client;
 
 typedef struct {
@@ -46,6 +58,40 @@ void broadcast_message(const char *message) {
     pthread_mutex_unlock(&client_mutex);  // Unlocking after sending the message
 }
 
+// Function to relay a binary control packet, as text to clients that did not ask for binary
+void relay_packet(const unsigned char *pkt) {
+    char ip[INET_ADDRSTRLEN], text[BUFFER_SIZE];
+    int16_t left = (int16_t)(pkt[6] << 8 | pkt[7]);
+    int16_t right = (int16_t)(pkt[8] << 8 | pkt[9]);
+    int len = 0;
+
+    inet_ntop(AF_INET, pkt + 2, ip, INET_ADDRSTRLEN);
+    switch (pkt[1]) {
+        case OP_STOP:
+            len = snprintf(text, sizeof(text), "[%s] stop\n", ip);
+            break;
+        case OP_MOVE:
+            if (left != PKT_KEEP) len += snprintf(text, sizeof(text), "[%s] move 0 %d\n", ip, left);
+            if (right != PKT_KEEP) len += snprintf(text + len, sizeof(text) - len, "[%s] move 1 %d\n", ip, right);
+            break;
+        case OP_FORWARD:
+            len = snprintf(text, sizeof(text), "[%s] forward %d\n", ip, left);
+            break;
+        default:
+            return;  // Unknown opcode
+    }
+
+    pthread_mutex_lock(&client_mutex);
+    for (int i = 0; i < client_count; i++) {
+        if (clients[i].binary) {
+            send(clients[i].socket_fd, pkt, PKT_SIZE, 0);
+        } else if (len) {
+            send(clients[i].socket_fd, text, len, 0);
+        }
+    }
+    pthread_mutex_unlock(&client_mutex);
+}
+
 // Function to find a client by IP address
 Client *get_client_by_ip(const char *ip) {
     for (int i = 0; i < client_count; i++) {
@@ -56,150 +102,201 @@ Client *get_client_by_ip(const char *ip) {
     return NULL;
 }
 
-// Function to handle client commands in a separate thread
-void *handle_client(void *arg) {
-    Args *args = (Args *)arg;
-    Client *client = &(args->clients[args->self]);  // Get the client data
-    char buffer[BUFFER_SIZE];
-    int bytes_received;
-
-    printf("Client connected: %s\n", client->ip);
+// Function to handle one line a client sent
+void handle_line(Args *args, Client *client, char *buffer) {
+    printf("Received from %s: %s\n", client->ip, buffer);
 
-    // Main loop to process received messages
-    while ((bytes_received = recv(client->socket_fd, buffer, BUFFER_SIZE - 1, 0)) > 0) {
-        buffer[bytes_received] = '\0';  // Null-terminate the received buffer
-        // Lazily sanitize buffer for printing later on.
-        if (buffer[bytes_received-1] == '\n') buffer[bytes_received-1] = '\0';
-        if (buffer[bytes_received-1] == '\r') buffer[bytes_received-1] = '\0';
-        if (buffer[bytes_received-2] == '\n') buffer[bytes_received-2] = '\0';
+    char target_ip[INET_ADDRSTRLEN], command[BUFFER_SIZE], data[BUFFER_SIZE];
 
-        printf("Received from %s: %s\n", client->ip, buffer);
-
-        char target_ip[INET_ADDRSTRLEN], command[BUFFER_SIZE], data[BUFFER_SIZE];
-
-        // Parse the message and handle accordingly
-        if (sscanf(buffer, "[%15[^]]] %s %[^\n]", target_ip, command, data) >= 2) {
-            if (client->state == UNAUTHENTICATED) {
-                // Handle authentication
-                if (strcmp(target_ip, "0.0.0.0") == 0) {
-                    if (strcmp(command, "slave") == 0) {
-                        pthread_mutex_lock(&client_mutex);
-                        client->state = SLAVE;
-                        pthread_mutex_unlock(&client_mutex);
-                        printf("Client %s authenticated as a slave\n", client->ip);
-                    } else if (strcmp(command, "admin") == 0) {
-                        pthread_mutex_lock(&client_mutex);
-                        client->state = ADMIN;
-                        pthread_mutex_unlock(&client_mutex);
-                        printf("Client %s authenticated as an admin\n", client->ip);
-                    } else {
-                        send(client->socket_fd, "[0.0.0.0] Authentication required\n", 34, 0);
-                    }
-                }
-            } else if (strcmp(command, "vote") == 0) {
-                // Handle vote command
-                printf("Vote initiated by %s\n", client->ip);
-                broadcast_message("[0.0.0.0] vote\n");
-                for (int i = 0; i < *args->count; i++) {
-                    if (args->clients[i].state != ADMIN) {
-                        pthread_mutex_lock(&client_mutex);
-                        args->clients[i].vote_value = -1;  // Reset vote for slaves
-                        args->clients[i].state = SLAVE; // Revert back to slave
-                        pthread_mutex_unlock(&client_mutex);
-                    }
-                }
-            } else if (strcmp(command, "clients") == 0) {
-                // Handle clients listing command
-                if (client->state == ADMIN || client->state == MASTER) {
-                    uint8_t total_length = 0;
+    // Parse the message and handle accordingly
+    if (sscanf(buffer, "[%15[^]]] %s %[^\n]", target_ip, command, data) >= 2) {
+        if (client->state == UNAUTHENTICATED) {
+            // Handle authentication
+            if (strcmp(target_ip, "0.0.0.0") == 0) {
+                if (strcmp(command, "slave") == 0) {
                     pthread_mutex_lock(&client_mutex);
-                    for (uint8_t i = 0; i < *args->count; i++) {
-                        total_length += strlen(args->clients[i].ip) + (i > 0 ? 1 : 0);
-                    }
+                    client->state = SLAVE;
                     pthread_mutex_unlock(&client_mutex);
-                    total_length += strlen(client->ip) + 5;
-
-                    char *message = (char *)malloc(total_length);
-
-                    message[0] = '\0';
-                    strcat(message, "[");
-                    strcat(message, client->ip);
-                    strcat(message, "]");
-                    for (uint8_t i = 0; i < *args->count; i++) {
-                        strcat(message, " ");
-                        strcat(message, clients[i].ip);
-                    }
-                    strcat(message, "\n");
-                    broadcast_message(message);
-                    free(message);
-                } else {
-                    send(client->socket_fd, "[0.0.0.0] Unauthorized command\n", 32, 0);
-                }
-            } else if (strcmp(command, "move") == 0 || strcmp(command, "stop") == 0 || strcmp(command, "reset") == 0) {
-                // Handle move, stop, and reset commands
-                if (client->state == ADMIN || client->state == MASTER) {
-                    broadcast_message(buffer);  // Broadcast the command to all clients
+                    printf("Client %s authenticated as a slave\n", client->ip);
+                } else if (strcmp(command, "admin") == 0) {
+                    pthread_mutex_lock(&client_mutex);
+                    client->state = ADMIN;
+                    pthread_mutex_unlock(&client_mutex);
+                    printf("Client %s authenticated as an admin\n", client->ip);
                 } else {
-                    send(client->socket_fd, "[0.0.0.0] Unauthorized command\n", 32, 0);
+                    send(client->socket_fd, "[0.0.0.0] Authentication required\n", 34, 0);
                 }
-            } else if (client->state == SLAVE && strcmp(target_ip, "0.0.0.0") == 0) {
-                // Handle vote submission by slave clients
-                int vote = atoi(command);
-                if (vote >= 0 && vote <= 255) {
+            }
+        } else if (strcmp(command, "binary") == 0) {
+            // Handle binary negotiation, packets get relayed to this client as is
+            pthread_mutex_lock(&client_mutex);
+            client->binary = 1;
+            pthread_mutex_unlock(&client_mutex);
+            send(client->socket_fd, "[0.0.0.0] binary\n", 17, 0);
+            printf("Client %s takes binary packets\n", client->ip);
+        } else if (strcmp(command, "ping") == 0) {
+            // Handle link check, answered to the sender alone
+            send(client->socket_fd, "[0.0.0.0] pong\n", 15, 0);
+        } else if (strcmp(command, "vote") == 0) {
+            // Handle vote command
+            printf("Vote initiated by %s\n", client->ip);
+            broadcast_message("[0.0.0.0] vote\n");
+            for (int i = 0; i < *args->count; i++) {
+                if (args->clients[i].state != ADMIN) {
                     pthread_mutex_lock(&client_mutex);
-                    client->vote_value = vote;  // Set the vote value for the slave client
+                    args->clients[i].vote_value = -1;  // Reset vote for slaves
+                    args->clients[i].state = SLAVE; // Revert back to slave
                     pthread_mutex_unlock(&client_mutex);
-                    printf("Vote from slave %s: %d\n", client->ip, vote);
-
-                    // Check if all votes are received
-                    int all_votes_received = 1;
-                    pthread_mutex_lock(&client_mutex);
-                    for (int i = 0; i < *args->count; i++) {
-                        if (args->clients[i].state == SLAVE && args->clients[i].vote_value == -1) {
-                            all_votes_received = 0;
-                            break;
-                        }
+                }
+            }
+        } else if (strcmp(command, "clients") == 0) {
+            // Handle clients listing command
+            if (client->state == ADMIN || client->state == MASTER) {
+                uint8_t total_length = 0;
+                pthread_mutex_lock(&client_mutex);
+                for (uint8_t i = 0; i < *args->count; i++) {
+                    total_length += strlen(args->clients[i].ip) + (i > 0 ? 1 : 0);
+                }
+                pthread_mutex_unlock(&client_mutex);
+                total_length += strlen(client->ip) + 5;
+
+                char *message = (char *)malloc(total_length);
+
+                message[0] = '\0';
+                strcat(message, "[");
+                strcat(message, client->ip);
+                strcat(message, "]");
+                for (uint8_t i = 0; i < *args->count; i++) {
+                    strcat(message, " ");
+                    strcat(message, clients[i].ip);
+                }
+                strcat(message, "\n");
+                broadcast_message(message);
+                free(message);
+            } else {
+                send(client->socket_fd, "[0.0.0.0] Unauthorized command\n", 32, 0);
+            }
+        } else if (strcmp(command, "move") == 0 || strcmp(command, "forward") == 0 || strcmp(command, "stop") == 0 || strcmp(command, "reset") == 0) {
+            // Handle move, forward, stop, and reset commands
+            if (client->state == ADMIN || client->state == MASTER) {
+                char message[BUFFER_SIZE + 1];
+                snprintf(message, sizeof(message), "%s\n", buffer);  // Sanitizing took the newline clients frame by
+                broadcast_message(message);  // Broadcast the command to all clients
+            } else {
+                send(client->socket_fd, "[0.0.0.0] Unauthorized command\n", 32, 0);
+            }
+        } else if (client->state == SLAVE && strcmp(target_ip, "0.0.0.0") == 0) {
+            // Handle vote submission by slave clients
+            int vote = atoi(command);
+            if (vote >= 0 && vote <= 255) {
+                pthread_mutex_lock(&client_mutex);
+                client->vote_value = vote;  // Set the vote value for the slave client
+                pthread_mutex_unlock(&client_mutex);
+                printf("Vote from slave %s: %d\n", client->ip, vote);
+
+                // Check if all votes are received
+                int all_votes_received = 1;
+                pthread_mutex_lock(&client_mutex);
+                for (int i = 0; i < *args->count; i++) {
+                    if (args->clients[i].state == SLAVE && args->clients[i].vote_value == -1) {
+                        all_votes_received = 0;
+                        break;
                     }
-                    pthread_mutex_unlock(&client_mutex);
+                }
+                pthread_mutex_unlock(&client_mutex);
 
-                    if (all_votes_received) {
-                        // All votes received, decide on the master (king)
-                        int max_vote = -1;
-                        Client *winner = NULL;
-                        for (int i = 0; i < *args->count; i++) {
-                            if (args->clients[i].state == SLAVE) {
-                                printf("Client %s has score %d, ", args->clients[i].ip, args->clients[i].vote_value);
-                                if (args->clients[i].vote_value > max_vote) {
-                                    if (max_vote == -1) {
-                                        // From NULL
-                                        printf("setting the first score.\n");
-                                    } else {
-                                        // > max
-                                        printf("beating %s's score of %d.\n", winner->ip, winner->vote_value);
-                                    }
-                                    max_vote = args->clients[i].vote_value;
-                                    winner = &args->clients[i];
+                if (all_votes_received) {
+                    // All votes received, decide on the master (king)
+                    int max_vote = -1;
+                    Client *winner = NULL;
+                    for (int i = 0; i < *args->count; i++) {
+                        if (args->clients[i].state == SLAVE) {
+                            printf("Client %s has score %d, ", args->clients[i].ip, args->clients[i].vote_value);
+                            if (args->clients[i].vote_value > max_vote) {
+                                if (max_vote == -1) {
+                                    // From NULL
+                                    printf("setting the first score.\n");
                                 } else {
-                                    // <max
-                                    printf("not beating %s.\n", winner->ip);
+                                    // > max
+                                    printf("beating %s's score of %d.\n", winner->ip, winner->vote_value);
                                 }
+                                max_vote = args->clients[i].vote_value;
+                                winner = &args->clients[i];
+                            } else {
+                                // <max
+                                printf("not beating %s.\n", winner->ip);
                             }
                         }
-                        if (winner) {
-                            // Crown the winner as the master
-                            pthread_mutex_lock(&client_mutex);
-                            winner->state = MASTER;
-                            char message[BUFFER_SIZE];
-                            snprintf(message, sizeof(message), "[%s] master\n", winner->ip);
-                            pthread_mutex_unlock(&client_mutex);
-                            broadcast_message(message);
-                            printf("Crowned: %s\n", winner->ip);
-                        }
+                    }
+                    if (winner) {
+                        // Crown the winner as the master
+                        pthread_mutex_lock(&client_mutex);
+                        winner->state = MASTER;
+                        char message[BUFFER_SIZE];
+                        snprintf(message, sizeof(message), "[%s] master\n", winner->ip);
+                        pthread_mutex_unlock(&client_mutex);
+                        broadcast_message(message);
+                        printf("Crowned: %s\n", winner->ip);
                     }
                 }
             }
         }
     }
+}
+
+// Function to handle one binary control packet a client sent
+void handle_packet(Client *client, const unsigned char *pkt) {
+    if (client->state != ADMIN && client->state != MASTER) {
+        send(client->socket_fd, "[0.0.0.0] Unauthorized command\n", 32, 0);
+        return;
+    }
+    // Older than this sender's last packet is stale, but a stop always goes
+    int seq = pkt[10] << 8 | pkt[11];
+    int behind = (client->last_seq - seq) & 0xFFFF;
+    int stale = client->last_seq >= 0 && behind > 0 && behind < 0x8000;
+    if (stale && pkt[1] != OP_STOP) return;
+    if (!stale) client->last_seq = seq;
+    relay_packet(pkt);
+}
+
+// Function to handle client commands in a separate thread
+void *handle_client(void *arg) {
+    Args *args = (Args *)arg;
+    Client *client = &(args->clients[args->self]);  // Get the client data
+    char buffer[BUFFER_SIZE];
+    int pending = 0;  // Bytes of an unfinished line or packet at the start of buffer
+    int bytes_received;
+
+    printf("Client connected: %s\n", client->ip);
+
+    // Main loop to process received messages. Lines and binary packets can
+    // arrive together or split across receives, each frame is handled once whole:
+    // a packet is PKT_MAGIC and PKT_SIZE bytes, anything else runs up to a newline.
+    while ((bytes_received = recv(client->socket_fd, buffer + pending, BUFFER_SIZE - 1 - pending, 0)) > 0) {
+        int end = pending + bytes_received;
+        int pos = 0;
+        while (pos < end) {
+            if ((unsigned char)buffer[pos] == PKT_MAGIC) {
+                if (end - pos < PKT_SIZE) break;  // The rest comes with the next receive
+                handle_packet(client, (unsigned char *)buffer + pos);
+                pos += PKT_SIZE;
+                continue;
+            }
+            char *next = memchr(buffer + pos, '\n', end - pos);
+            if (!next) {
+                if (pos == 0 && end == BUFFER_SIZE - 1) pos = end;  // Too long for a line, drop it
+                break;
+            }
+            *next = '\0';
+            char *line = buffer + pos;
+            size_t len = next - line;
+            if (len && line[len - 1] == '\r') line[--len] = '\0';
+            if (len) handle_line(args, client, line);
+            pos = next - buffer + 1;
+        }
+        pending = end - pos;
+        memmove(buffer, buffer + pos, pending);
+    }
 
     printf("Client disconnected: %s. %d clients remain\n", client->ip, *args->count - 1);
     close(client->socket_fd);
@@ -224,6 +321,9 @@ int main() {
     struct sockaddr_in server_addr, client_addr;
     socklen_t client_len = sizeof(client_addr);
 
+    // A client that went away shows up as a failed send, not a dead server
+    signal(SIGPIPE, SIG_IGN);
+
     // Create server socket
     if ((server_fd = socket(AF_INET, SOCK_STREAM, 0)) < 0) {
         perror("Socket creation failed");
@@ -275,6 +375,8 @@ int main() {
         strncpy(new_client->ip, client_ip, INET_ADDRSTRLEN);
         new_client->state = UNAUTHENTICATED;
         new_client->vote_value = -1;
+        new_client->binary = 0;
+        new_client->last_seq = -1;
 
         pthread_mutex_lock(&client_mutex);
         if (client_count < MAX_CLIENTS) {